@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Date, ForeignKey, Integer
+from sqlalchemy import Column, String, Float, Date, DateTime, ForeignKey, Integer, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -22,3 +22,66 @@ class Observation(Base):
     value = Column(Float)
 
     series = relationship("Series", back_populates="observations")
+
+    # One value per series per date; also the conflict target for ingest upserts.
+    # Range reads for a series walk this index in date order; on Postgres it
+    # carries `value` too so /series reads never touch the heap.
+    __table_args__ = (
+        Index("ix_observations_series_date", "series_id", "date", unique=True, postgresql_include=["value"]),
+    )
+
+
+class ObservationVintage(Base):
+    # Revision history of observations: `value` is what FRED reported for
+    # (series_id, date) from realtime_start up to, not including, realtime_end
+    # (NULL while it is still the current value). Ingest appends a row per new
+    # or revised print and closes the interval it replaces; rows are never
+    # deleted, so any past as-of date can be reconstructed.
+    __tablename__ = "observation_vintages"
+    id = Column(Integer, primary_key=True)
+    series_id = Column(String, ForeignKey("series.series_id"))
+    date = Column(Date)
+    value = Column(Float)
+    realtime_start = Column(Date)
+    realtime_end = Column(Date)
+
+    # As-of reads for a series walk this index in date order and keep the
+    # interval covering the as-of date
+    __table_args__ = (
+        Index("ix_observation_vintages_asof", "series_id", "date", "realtime_start", unique=True,
+              postgresql_include=["realtime_end", "value"]),
+    )
+
+
+class MonthlyFeature(Base):
+    # Month-end feature rows maintained by ingest: `level` is the forward-filled
+    # month-end value of the series, `value` the model feature derived from it
+    # (the level itself, or the YoY change for LEVEL_SERIES). NULL is missing.
+    __tablename__ = "monthly_features"
+    month = Column(Date, primary_key=True)
+    series_id = Column(String, primary_key=True)
+    level = Column(Float)
+    value = Column(Float)
+
+class MonthlyFeatureState(Base):
+    # Data version the monthly_features rows were last refreshed for
+    __tablename__ = "monthly_features_state"
+    id = Column(Integer, primary_key=True)
+    version = Column(String)
+    updated_at = Column(DateTime)
+
+class DialScore(Base):
+    # Dial score + SHAP contributors computed once per data/model version
+    __tablename__ = "dial_scores"
+    version = Column(String, primary_key=True)
+    score = Column(Float)
+    contributors = Column(JSON)
+    computed_at = Column(DateTime)
+
+class DataVersion(Base):
+    # Single-row stamp that ingest rewrites after every run. Caches key on it
+    # instead of aggregating the observations table on each request.
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(String)
+    updated_at = Column(DateTime)
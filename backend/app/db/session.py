@@ -1,9 +1,226 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
 
-engine = create_engine(os.environ["DATABASE_URL"])
+DATABASE_URL = os.environ["DATABASE_URL"]
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def _env_bool(name, default):
+    return os.environ.get(name, default).lower() in ("1", "true", "yes", "on")
+
+# Pool sizing and connection hygiene. Defaults match SQLAlchemy's (5 + 10)
+# except pre-ping, which is on so connections killed by a DB failover are
+# replaced on checkout instead of failing the request.
+POOL_SIZE = _env_int("DB_POOL_SIZE", "5")
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", "10")
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", "30")
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", "-1")
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "1")
+# Postgres statement_timeout in ms (0 = none)
+STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", "0")
+# SQLite: seconds a connection waits on a lock before "database is locked"
+SQLITE_BUSY_TIMEOUT = _env_int("SQLITE_BUSY_TIMEOUT", "30")
+# SQLite: serve API reads from read-only connections (requires WAL to help)
+SQLITE_READONLY_READS = _env_bool("SQLITE_READONLY_READS", "1")
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self.lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+class _TimedPoolMixin:
+    # Measures how long each checkout waits for a free connection
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return conn
+
+_engines = {}
+
+def _timed_pool(base):
+    stats = PoolStats()
+    pool_class = type(f"Timed{base.__name__}", (_TimedPoolMixin, base), {"stats": stats})
+    return pool_class, stats
+
+def async_url(url):
+    # Same database through its asyncio driver: sqlite -> aiosqlite, postgresql -> asyncpg
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def _readonly_sqlite_url(url):
+    # Opens the same file through a read-only URI connection
+    return url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+
+def _is_file_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _engine_kwargs(url, is_async, name):
+    backend = url.get_backend_name()
+    kwargs = {"pool_pre_ping": POOL_PRE_PING}
+    if backend == "sqlite" and not _is_file_sqlite(url):
+        # In-memory databases live on a single connection; leave pooling alone
+        return kwargs
+
+    pool_class, stats = _timed_pool(AsyncAdaptedQueuePool if is_async else QueuePool)
+    _engines[name] = stats
+    kwargs.update(
+        poolclass=pool_class,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+
+    if backend == "sqlite":
+        kwargs["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT}
+    elif backend == "postgresql" and STATEMENT_TIMEOUT_MS:
+        if is_async:
+            kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+        else:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+    return kwargs
+
+def _sqlite_pragmas(sync_engine, writer):
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if writer:
+            # WAL lets readers proceed while ingest holds the write lock.
+            # It is persistent in the file, so only writers need to set it.
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}")
+        cursor.close()
+
+def _build_engine(url, name, readonly=False):
+    url = make_url(url)
+    if readonly and _is_file_sqlite(url):
+        url = _readonly_sqlite_url(url)
+    eng = create_engine(url, **_engine_kwargs(url, False, name))
+    if url.get_backend_name() == "sqlite":
+        _sqlite_pragmas(eng, writer=not readonly)
+    return eng
+
+def _build_async_engine(url, name, readonly=False):
+    url = async_url(url)
+    if readonly and _is_file_sqlite(url):
+        url = _readonly_sqlite_url(url)
+    eng = create_async_engine(url, **_engine_kwargs(url, True, name))
+    if url.get_backend_name() == "sqlite":
+        _sqlite_pragmas(eng.sync_engine, writer=not readonly)
+    return eng
+
+_readonly = SQLITE_READONLY_READS and _is_file_sqlite(make_url(DATABASE_URL))
+
+engine = _build_engine(DATABASE_URL, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Read-only endpoints (/categories). On SQLite these are separate read-only
+# connections; elsewhere it is simply the main engine.
+read_engine = _build_engine(DATABASE_URL, "sync_read", readonly=True) if _readonly else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+class ThreadedSession:
+    # AsyncSession stand-in for databases without an asyncio driver: the same
+    # calls run a sync session on a worker thread, so the event loop never
+    # blocks on the database
+    def __init__(self):
+        self.sync_session = ReadSessionLocal()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.sync_session, *args, **kwargs)
+
+    async def execute(self, statement):
+        # Fetched on the thread, like AsyncSession's buffered results
+        frozen = await asyncio.to_thread(lambda: self.sync_session.execute(statement).freeze())
+        return frozen()
+
+    async def close(self):
+        await asyncio.to_thread(self.sync_session.close)
+
+def _async_engine_or_none():
+    try:
+        return _build_async_engine(DATABASE_URL, "async", readonly=_readonly)
+    except (ValueError, ImportError) as e:
+        print(f"Async database access unavailable, using sync sessions on worker threads: {e}")
+        return None
+
+# Used by the I/O-bound read endpoints so they don't hold a threadpool slot.
+# None when the backend has no asyncio driver mapped (or it isn't installed);
+# AsyncSessionLocal then hands out ThreadedSessions and streams are read
+# through a sync session instead.
+async_engine = _async_engine_or_none()
+if async_engine is not None:
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = ThreadedSession
+
+def pool_stats():
+    # Pool pressure per engine: current occupancy plus cumulative checkout waits
+    out = {}
+    engines = [("sync", engine), ("sync_read", read_engine)]
+    if async_engine is not None:
+        engines.append(("async", async_engine.sync_engine))
+    for name, eng in engines:
+        if name == "sync_read" and read_engine is engine:
+            continue
+        pool = eng.pool
+        stats = _engines.get(name)
+        entry = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=MAX_OVERFLOW,
+            )
+        if stats is not None:
+            with stats.lock:
+                entry.update(
+                    checkouts=stats.checkouts,
+                    timeouts=stats.timeouts,
+                    avg_wait_ms=(stats.wait_seconds / stats.checkouts * 1000) if stats.checkouts else 0.0,
+                    max_wait_ms=stats.max_wait_seconds * 1000,
+                )
+        out[name] = entry
+    return out
@@ -1,3 +1,6 @@
+import calendar
+from datetime import date, timedelta
+
 SERIES_TO_LOAD = {
     "UNRATE": "Labor Market",
     "PAYEMS": "Labor Market",
@@ -28,4 +31,61 @@ SERIES_TO_LOAD = {
 
     "USREC": "Recession"
 
-}
\ No newline at end of file
+}
+
+# Approximate days from the end of the period an observation measures to
+# FRED's first release of it, rounded up. Used to date values whose real
+# vintages are unknown (the init_db seed and a series' first ingest) until
+# scripts.backfill_vintages loads FRED's own.
+RELEASE_LAG_DAYS = {
+    # Employment Situation, first Friday of the next month
+    "UNRATE": 10,
+    "PAYEMS": 10,
+    "AHETPI": 10,
+    # Claims for the week ending Saturday come out the next Thursday
+    "IC4WSA": 6,
+
+    # Personal Income and Outlays, near the end of the next month
+    "PCE": 31,
+    "DSPIC96": 31,
+    "CPIAUCSL": 17,
+    "CPILFESL": 17,
+    "CSCICP03USM665S": 45,
+
+    # Daily rates (and their monthly averages) are out the next day
+    "FEDFUNDS": 1,
+    "GS10": 1,
+    "T10Y2Y": 1,
+    "DGS10": 1,
+    "GS1": 1,
+    "AAA10Y": 1,
+    # H.6 money stock, monthly, covering the previous month's weeks
+    "M2REAL": 28,
+    "WM2NS": 35,
+
+    "INDPRO": 18,
+    "IPMAN": 18,
+    "WPSFD49207": 16,
+
+    "HOUST": 19,
+    "PERMIT": 19,
+}
+
+# Anything else, including USREC (the label, not a model input)
+DEFAULT_RELEASE_LAG_DAYS = 31
+
+# Months covered by an observation dated at the start of its period
+PERIOD_MONTHS = {"M": 1, "Q": 3, "SA": 6, "A": 12}
+
+def first_release(series_id, frequency, obs_date):
+    # Approximate date FRED first published the value for `obs_date`: the end
+    # of its period plus the series' release lag. Monthly and longer values
+    # are dated at the start of their period, daily and weekly ones at the end.
+    months = PERIOD_MONTHS.get(frequency)
+    if months is None:
+        end = obs_date
+    else:
+        last = obs_date.month + months - 1
+        year, month = obs_date.year + (last - 1) // 12, (last - 1) % 12 + 1
+        end = date(year, month, calendar.monthrange(year, month)[1])
+    return end + timedelta(days=RELEASE_LAG_DAYS.get(series_id, DEFAULT_RELEASE_LAG_DAYS))
@@ -1,13 +1,32 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.fred import router as fred_router
 from app.routers.ml import router as ml_router
+from app.db.session import pool_stats
+from app.services.executor import build_executor, inference_executor, shadow_executor
+from app.services.instrumentation import InstrumentationMiddleware, render_metrics
+from app.services.ml_service import model_info, startup_timings, warm_up
+from app.services.response_cache import response_cache
+
+_imported = time.perf_counter()
 
 load_dotenv()
 
-app = FastAPI(title="Crash Compass API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload the model and explainer before accepting traffic (WARMUP=0 to skip)
+    if os.environ.get("WARMUP", "1") != "0":
+        await asyncio.to_thread(warm_up)
+    startup_timings["ready_ms"] = (time.perf_counter() - _imported) * 1000
+    print(f"Startup complete: {startup_timings}")
+    yield
+
+app = FastAPI(title="Crash Compass API", lifespan=lifespan)
 
 allow_origins = (os.environ.get("ALLOW_ORIGINS") or "http://localhost:3000").split(",")
 allow_origins = [o.strip() for o in allow_origins if o.strip()]
@@ -18,11 +37,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Outermost, so request timings include CORS handling
+app.add_middleware(InstrumentationMiddleware)
+
+# async so it runs on the event loop and answers even when every worker
+# thread is busy
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"ok": True}
 
+# Prometheus scrape target: stage and request latency histograms plus the
+# pool, executor and cache stats from the JSON endpoints below
+@app.get("/metrics")
+async def metrics():
+    body = render_metrics({
+        "inference": inference_executor.stats(),
+        "build": build_executor.stats(),
+        "shadow": shadow_executor.stats(),
+        "db_pool": pool_stats(),
+        "cache": response_cache.stats(),
+    })
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    return inference_executor.stats()
+
+@app.get("/metrics/db")
+async def db_metrics():
+    return pool_stats()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return response_cache.stats()
+
+# Sync so a cold first call loads the model on the threadpool, not the loop
+@app.get("/metrics/model")
+def model_metrics():
+    return model_info()
+
+@app.get("/metrics/startup")
+async def startup_metrics():
+    return startup_timings
+
 app.include_router(fred_router)
 app.include_router(ml_router)
\ No newline at end of file
@@ -1,8 +1,24 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+import asyncio
+import orjson
+from datetime import date
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.services.get_fred_data import get_series_db, get_categories_with_series
-from app.services.ml_service import predict_recession_prob
+from app.db.session import SessionLocal, ReadSessionLocal, AsyncSessionLocal, async_engine
+from app.services.data_version import get_data_version
+from app.services.executor import build_executor, inference_executor, ExecutorSaturated
+from app.services.get_fred_data import (
+    aget_series_meta, aread_observations, build_series, iter_series_ndjson, aiter_series_ndjson,
+    get_categories_with_series, outlook_window_start
+)
+from app.services.http_cache import etag_matches
+from app.services.instrumentation import stage
+from app.services.ml_service import (
+    active_model, cached_dial_score, get_precomputed_dial_score, get_score_version, model_loaded,
+    predict_recession_prob, shadow_dial_score
+)
+from app.services.response_cache import CACHE_CONTROL, CachedResponse, cache_key, make_etag, response_cache
 
 router = APIRouter(prefix="/api/v1/fred", tags=["FRED"])
 
@@ -13,27 +29,177 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+NDJSON = "application/x-ndjson"
+
+def _cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def _not_modified(request: Request, etag):
+    # 304 before any cache lookup or DB work beyond reading the version
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+def _cached_response(entry: CachedResponse, etag):
+    return Response(content=entry.body, media_type=entry.media_type, headers=_cache_headers(etag))
+
+async def _astream_series(series_id, start, end, **reduce):
+    # The stream outlives the request dependency, so it owns its session
+    async with AsyncSessionLocal() as db:
+        async for chunk in aiter_series_ndjson(series_id=series_id, start=start, end=end, session=db, **reduce):
+            yield chunk
+
+def _sync_stream_series(series_id, start, end, **reduce):
+    # Without an async driver; Starlette iterates this on its threadpool
+    db = ReadSessionLocal()
+    try:
+        yield from iter_series_ndjson(series_id=series_id, start=start, end=end, session=db, **reduce)
+    finally:
+        db.close()
+
+def _series_body(series_id, meta, rows, fmt, start, end, reduce):
+    # Runs on the build executor: everything after the reads
+    data = build_series(series_id, meta, rows, fmt, start, end, **reduce)
+    with stage("serialize"):
+        return CachedResponse(orjson.dumps(data))
+
+def _stream_series(series_id, start, end, **reduce):
+    if async_engine is None:
+        return _sync_stream_series(series_id, start, end, **reduce)
+    return _astream_series(series_id, start, end, **reduce)
+
 @router.get("/series/{series_id}")
-def series(series_id: str, start: str = None, end: str = None, db: Session = Depends(get_db)):
+async def series(
+    series_id: str,
+    request: Request,
+    start: str = None,
+    end: str = None,
+    fmt: str = Query("rows", alias="format", pattern="^(rows|columnar|stream)$"),
+    freq: str = Query(None, pattern="^(weekly|monthly|quarterly)$"),
+    agg: str = Query("last", pattern="^(last|mean|min|max)$"),
+    max_points: int = Query(None, ge=3, le=100000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # format=rows (default): [{"date", "value"}] with string values
+    # format=columnar: {"dates": [...], "values": [...]} with numeric values
+    # format=stream or Accept: application/x-ndjson: chunked NDJSON
+    # freq/agg aggregate to one point per period; max_points applies LTTB after that
+    if fmt == "rows" and NDJSON in request.headers.get("accept", ""):
+        fmt = "stream"
+    reduce = {"freq": freq, "agg": agg, "max_points": max_points}
+
     try:
-        data = get_series_db(series_id=series_id, start=start, end=end, session=db)
-        return data
+        if fmt == "stream":
+            # Fail fast on unknown series before committing to a 200 stream
+            await aget_series_meta(series_id, db)
+            return StreamingResponse(_stream_series(series_id, start, end, **reduce), media_type=NDJSON)
+
+        version = await db.run_sync(get_data_version)
+        key = cache_key(f"series:{fmt}", version, series_id=series_id, start=start, end=end, **reduce)
+        etag = make_etag(key)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        entry = await response_cache.aget(key)
+        if entry is None:
+            # Only the reads are awaited on the loop; the rest runs on the build executor
+            meta = await aget_series_meta(series_id, db)
+            rows = await aread_observations(series_id, start, end, db)
+            await db.close()
+            entry = await build_executor.run(_series_body, series_id, meta, rows, fmt, start, end, reduce)
+            await response_cache.aset(key, entry)
+        return _cached_response(entry, etag)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code = 500, detail = str(e))
 
 @router.get("/categories")
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_read_db)):
     try:
-        return get_categories_with_series(session=db)
+        key = cache_key("categories", get_data_version(db), window=outlook_window_start())
+        etag = make_etag(key)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        entry = response_cache.get(key)
+        if entry is None:
+            categories = get_categories_with_series(session=db)
+            with stage("serialize"):
+                entry = CachedResponse(orjson.dumps(categories))
+            response_cache.set(key, entry)
+        return _cached_response(entry, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+def _dial_score_job(version, as_of=None):
+    # Runs on the inference executor with its own sync session
+    db = SessionLocal()
+    try:
+        if as_of is not None:
+            return predict_recession_prob(session=db, as_of=as_of)
+        return get_precomputed_dial_score(session=db, version=version)
+    finally:
+        db.close()
+
 @router.get("/dial_score")
-def get_dial_score(db: Session = Depends(get_db)):
+async def get_dial_score(request: Request, as_of: date = None, db: AsyncSession = Depends(get_async_db)):
+    # as_of=YYYY-MM-DD scores that date's month on the data published by then
     try:
-        result = predict_recession_prob(session=db)
-        if result is None:
-            return {"score": 0.0, "contributors": []}
-        return result
+        if not model_loaded():
+            # A cold model load must not run on the event loop
+            await asyncio.to_thread(active_model)
+        version = await db.run_sync(get_score_version)
+        key = cache_key("dial_score", version, as_of=as_of)
+        etag = make_etag(key)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        entry = await response_cache.aget(key)
+        if entry is None:
+            result = cached_dial_score(version) if as_of is None else None
+            if result is None:
+                # Hand the pooled connection back before queueing, otherwise waiting
+                # inference requests starve /series of connections
+                await db.close()
+                result = await inference_executor.run(_dial_score_job, version, as_of)
+            # Only a score stored for this exact version is cached; a stand-in
+            # served while the scheduler catches up must not outlive it
+            final = as_of is not None or cached_dial_score(version) is not None
+            if result is None:
+                if as_of is not None:
+                    # Nothing was published by then; not cached, since a
+                    # backfill can add earlier vintages under a new version
+                    raise HTTPException(status_code=404, detail=f"No data published by {as_of}")
+                result = {"score": 0.0, "contributors": []}
+            with stage("serialize"):
+                entry = CachedResponse(orjson.dumps(result))
+            if not final:
+                shadow_dial_score(as_of)
+                return Response(content=entry.body, media_type=entry.media_type, headers={"Cache-Control": "no-cache"})
+            await response_cache.aset(key, entry)
+        # A candidate model, if any, scores the served month in the background
+        shadow_dial_score(as_of)
+        return _cached_response(entry, etag)
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,18 +1,70 @@
-import json
-import os
-from fastapi import APIRouter, HTTPException
+from datetime import date
+from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel, Field, FiniteFloat
+from app.db.session import SessionLocal
+from app.services.backtest import HISTORY_PATH, get_history_snapshot
+from app.services.executor import inference_executor, ExecutorSaturated
+from app.services.http_cache import GZIP_MIN_BYTES, accepts_gzip, etag_matches
+from app.services.ml_service import BATCH_MAX_OVERRIDES, BATCH_MAX_ROWS, score_batch
 
 router = APIRouter(prefix="/api/v1/ml", tags=["ML"])
 
-# Path is relative to where uvicorn is run (usually backend/)
-HISTORY_PATH = "app/ml_models/history.json"
-
+# Sync so reloading history.json and gzipping a range run on the threadpool
 @router.get("/history")
-def get_history():
-    if not os.path.exists(HISTORY_PATH):
+def get_history(request: Request, start: str = None, end: str = None):
+    # Served from an in-memory, pre-encoded copy of history.json that is
+    # reloaded when the file changes. start/end (YYYY-MM-DD, inclusive)
+    # select a date range; If-None-Match gets a 304 when nothing changed.
+    try:
+        snapshot = get_history_snapshot(HISTORY_PATH)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="History not found. Please run generation script.")
-        
-    with open(HISTORY_PATH, "r") as f:
-        data = json.load(f)
-    return data
 
+    i, j = snapshot.bounds(start, end)
+    gzipped = snapshot.size(i, j) >= GZIP_MIN_BYTES and accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {"ETag": snapshot.range_etag(i, j, gzipped), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzipped(i, j), media_type="application/json", headers=headers)
+    return Response(content=snapshot.slice(i, j), media_type="application/json", headers=headers)
+
+class Scenario(BaseModel):
+    # Feature overrides applied on top of the month containing as_of (latest
+    # month when omitted), e.g. {"UNRATE": 6.5, "T10Y3M": -1.0}
+    as_of: Optional[date] = None
+    overrides: Dict[str, FiniteFloat] = Field(default_factory=dict, max_length=BATCH_MAX_OVERRIDES)
+
+class ScoreRequest(BaseModel):
+    dates: List[date] = Field(default_factory=list, max_length=BATCH_MAX_ROWS)
+    scenarios: List[Scenario] = Field(default_factory=list, max_length=BATCH_MAX_ROWS)
+    explain: bool = False
+
+def _score_job(dates, scenarios, explain):
+    # Runs on the inference executor with its own sync session
+    db = SessionLocal()
+    try:
+        return score_batch(db, dates=dates, scenarios=scenarios, explain=explain)
+    finally:
+        db.close()
+
+@router.post("/score")
+async def post_score(body: ScoreRequest):
+    # Scores as-of dates and what-if scenarios in one vectorized call. Row and
+    # SHAP limits are checked in score_batch (400 when exceeded).
+    scenarios = [s.model_dump() for s in body.scenarios]
+    try:
+        result = await inference_executor.run(_score_job, body.dates, scenarios, body.explain)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="No feature data. Please run the ingest script.")
+    return result
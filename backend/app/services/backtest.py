@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.models import ObservationVintage
+from app.services import ml_service
+from app.services.data_version import get_data_version
+from app.services.features import (
+    REFRESH_MONTHS, YOY_PERIODS, FeatureMatrix, build_feature_matrix, read_vintages, through_month, vintage_levels
+)
+from app.services.http_cache import compress
+
+HISTORY_PATH = "app/ml_models/history.json"
+
+# Rows per scoring task. Small enough that SHAP temporaries stay in cache and
+# chunks spread evenly over workers; large enough to amortise numpy overhead.
+CHUNK_ROWS = 128
+
+# Parsed, pre-encoded history.json for the API, replaced when the file changes
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".meta.json"
+
+def _scorer():
+    # (feature names, predict, explain) for the model the API is serving,
+    # fixed for the whole pass even if a new version is swapped in meanwhile
+    model = ml_service.active_model()
+    return list(model.feature_names), model.predict_proba, model.shap_values
+
+def _vintage_signature(session: Session, before):
+    # Count and highest id of the vintages published before `before`. Ingest
+    # only adds vintages at its run date, so this moves when older history is
+    # rewritten (backfill_vintages, a new series' first load), not on every run.
+    count, last_id = session.execute(
+        select(func.count(ObservationVintage.id), func.max(ObservationVintage.id))
+        .where(ObservationVintage.realtime_start < before)
+    ).one()
+    return f"{count}:{last_id}"
+
+def _refresh_start(records):
+    return pd.Timestamp(records[-1]["date"]) - pd.offsets.MonthEnd(REFRESH_MONTHS)
+
+def score_months(matrix, start=None, explain=False, top=3, workers=1, chunk_rows=CHUNK_ROWS):
+    # One record per month from `start` (inclusive) on, scored in row chunks.
+    # Chunks run on a thread pool when workers > 1; the compiled forest is pure
+    # numpy and releases the GIL in its matmuls.
+    features, predict, explain_fn = _scorer()
+
+    rows = slice(None) if start is None else slice(int(matrix.index.searchsorted(start)), None)
+    X = matrix.select(features, rows)
+    # Features the data doesn't have yet score as 0, rows still missing
+    # anything else (YoY warm-up, series not started) are skipped
+    missing = [c for c in features if c not in matrix.columns]
+    if missing:
+        X[missing] = 0.0
+    X = X.dropna()
+    if X.empty:
+        return []
+
+    usrec = matrix.select(["USREC"], rows)["USREC"].reindex(X.index).fillna(0)
+
+    def run(chunk):
+        phi = explain_fn(chunk) if explain else None
+        return predict(chunk), phi
+
+    chunks = [X.iloc[i:i + chunk_rows] for i in range(0, len(X), chunk_rows)]
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run, chunks))
+    else:
+        parts = [run(chunk) for chunk in chunks]
+
+    probs = np.concatenate([p for p, _ in parts])
+    records = [
+        {"date": d.strftime("%Y-%m-%d"), "prob": float(p), "is_recession": int(r)}
+        for d, p, r in zip(X.index, probs, usrec.to_numpy())
+    ]
+
+    if explain:
+        # Top contributors per month, same shape as the dial score's
+        phi = np.concatenate([s for _, s in parts])
+        order = np.argsort(-np.abs(phi), axis=1, kind="stable")[:, :top]
+        values = X.to_numpy()
+        for i, record in enumerate(records):
+            record["contributors"] = [
+                {"name": features[j], "value": float(values[i, j]), "shap": float(phi[i, j])}
+                for j in order[i]
+            ]
+    return records
+
+def point_in_time_matrix(session: Session, matrix: FeatureMatrix, start=None):
+    # Same months as `matrix`, but each row holds the features as they were
+    # published by that month's end (from observation_vintages), so revisions
+    # and late prints never leak into earlier scores. USREC keeps its current
+    # values: it is the label, not an input.
+    vintages = read_vintages(session)
+    first = 0 if start is None else int(matrix.index.searchsorted(start))
+    index = matrix.index[first:]
+    levels = np.full((len(index), len(matrix.series)), np.nan)
+    values = np.full((len(index), len(matrix.columns)), np.nan)
+    for i, month_end in enumerate(index):
+        # A couple of years is enough for the YoY base and sparse series
+        window_start = month_end - pd.offsets.MonthEnd(2 * YOY_PERIODS)
+        known = through_month(vintage_levels(vintages, month_end, start=window_start), month_end)
+        if known is None:
+            continue
+        known = known.reindex(columns=matrix.series).ffill()
+        row = FeatureMatrix(known.index, matrix.series, known.to_numpy(dtype=np.float64), matrix.version)
+        levels[i] = row.levels[-1]
+        values[i] = row.values[-1]
+
+    if "USREC" in matrix._positions:
+        j = matrix._positions["USREC"]
+        values[:, j] = matrix.values[first:, j]
+    return FeatureMatrix(index, matrix.series, levels, f"{matrix.version}@pit", values=np.asfortranarray(values))
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return [], None
+    with open(path) as f:
+        records = json.load(f)
+    meta = None
+    if os.path.exists(_meta_path(path)):
+        with open(_meta_path(path)) as f:
+            meta = json.load(f)
+    return records, meta
+
+def write_history(records, meta, path=HISTORY_PATH):
+    # Written to a temp file and renamed so readers never see a partial file
+    for target, payload in ((path, records), (_meta_path(path), meta)):
+        tmp = f"{target}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, target)
+
+def update_history(session: Session, full=False, explain=False, top=3, workers=1, path=HISTORY_PATH,
+                   point_in_time=False):
+    # Appends newly available months to the history store. The last
+    # REFRESH_MONTHS stored months are re-scored too, since their features can
+    # still move with late prints. Anything that invalidates older months (a
+    # different model, a change of explain/top/point_in_time, or for
+    # point_in_time rewritten vintages) triggers a full rebuild. point_in_time
+    # scores each month on the data as published by its end instead of
+    # today's revised values.
+    # Returns (records, number of months scored).
+    started = time.perf_counter()
+    data_version = get_data_version(session)
+    meta = {
+        "model": ml_service.active_model().digest,
+        "explain": bool(explain),
+        "top": int(top) if explain else None,
+        "point_in_time": bool(point_in_time),
+    }
+
+    existing, old_meta = ([], None) if full else load_history(path)
+    compatible = bool(existing) and old_meta is not None and all(old_meta.get(k) == v for k, v in meta.items())
+
+    if compatible and old_meta.get("data_version") == data_version:
+        print(f"History is current ({len(existing)} months)")
+        return existing, 0
+
+    if compatible and point_in_time:
+        # Months before the refresh window were scored on the vintages of the
+        # time; if those were rewritten since, every month has to be re-scored
+        before = old_meta.get("vintages_before")
+        compatible = before is not None and old_meta.get("vintages") == _vintage_signature(session, before)
+
+    matrix = build_feature_matrix(session, version=data_version)
+    if matrix is None:
+        return existing, 0
+
+    if compatible:
+        start = _refresh_start(existing)
+        cutoff = start.strftime("%Y-%m-%d")
+        kept = [r for r in existing if r["date"] < cutoff]
+    else:
+        start = None
+        kept = []
+
+    if point_in_time:
+        matrix = point_in_time_matrix(session, matrix, start)
+    scored = score_months(matrix, start=start, explain=explain, top=top, workers=workers)
+    records = kept + scored
+
+    meta.update(data_version=data_version, months=len(records))
+    if point_in_time and records:
+        # Checked on the next run against the months it keeps
+        before = _refresh_start(records).strftime("%Y-%m-%d")
+        meta.update(vintages_before=before, vintages=_vintage_signature(session, before))
+    write_history(records, meta, path)
+    mode = "full" if start is None else f"from {start:%Y-%m}"
+    print(f"Scored {len(scored)} months ({mode}) in {(time.perf_counter() - started) * 1000:.0f} ms; {len(records)} stored")
+    return records, len(scored)
+
+class HistorySnapshot:
+    # The history file encoded once as a JSON array, with the byte offset of
+    # every record so any date range is a slice of the same buffer.
+    GZIP_CACHE_SIZE = 32
+
+    def __init__(self, key, records):
+        self.key = key
+        self.dates = [r["date"] for r in records]
+        pieces = [orjson.dumps(r) for r in records]
+        self.body = b"[" + b",".join(pieces) + b"]"
+        # offsets[k] is where record k starts; offsets[n] is the closing "]"+1
+        self.offsets = np.cumsum([1] + [len(p) + 1 for p in pieces])
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self._gzip = OrderedDict()
+        self._gzip_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def bounds(self, start=None, end=None):
+        # [i, j) of records with start <= date <= end (ISO strings sort by date)
+        i = bisect_left(self.dates, start) if start else 0
+        j = bisect_right(self.dates, end) if end else len(self.dates)
+        return i, max(i, j)
+
+    def slice(self, i, j):
+        if i == 0 and j == len(self.dates):
+            return self.body
+        if i >= j:
+            return b"[]"
+        return b"[" + self.body[self.offsets[i]:self.offsets[j] - 1] + b"]"
+
+    def range_etag(self, i, j, gzipped=False):
+        # Strong validators are per representation, so the gzip body gets its own
+        tag = self.etag if i == 0 and j == len(self.dates) else f"{self.etag}-{i}-{j}"
+        return f'"{tag}-gz"' if gzipped else f'"{tag}"'
+
+    def size(self, i, j):
+        return int(self.offsets[j] - self.offsets[i]) + 1 if j > i else 2
+
+    def gzipped(self, i, j):
+        # Compressed bodies for the most recently requested ranges
+        with self._gzip_lock:
+            if (i, j) in self._gzip:
+                self._gzip.move_to_end((i, j))
+                return self._gzip[(i, j)]
+        body = compress(self.slice(i, j))
+        with self._gzip_lock:
+            self._gzip[(i, j)] = body
+            while len(self._gzip) > self.GZIP_CACHE_SIZE:
+                self._gzip.popitem(last=False)
+        return body
+
+def get_history_snapshot(path=HISTORY_PATH):
+    # Re-reads the file only when its mtime or size changes. Raises
+    # FileNotFoundError if history hasn't been generated.
+    global _snapshot
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.key == key:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot.key == key:
+            return _snapshot
+        with open(path, "rb") as f:
+            records = orjson.loads(f.read())
+        _snapshot = HistorySnapshot(key, records)
+        return _snapshot
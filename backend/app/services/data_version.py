@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import Session
+from app.db.models import DataVersion, Series, Observation, ObservationVintage
+
+# (database URL, table) pairs known to exist. Older DBs may lack newer tables
+# until init_db runs again, so a miss is re-checked on the next call.
+_known_tables = set()
+_known_tables_lock = threading.Lock()
+
+def compute_data_version(session: Session):
+    # Cheap aggregate stamp that changes whenever ingest touches the data.
+    # Series.updated_at alone only has day resolution, so the observation
+    # count and latest date are folded in to catch same-day re-ingests.
+    updated_at = session.execute(select(func.max(Series.updated_at))).scalar()
+    count, last_date = session.execute(
+        select(func.count(Observation.id), func.max(Observation.date))
+    ).one()
+    version = f"{updated_at}:{last_date}:{count}"
+    # Point-in-time reads come from observation_vintages, which
+    # backfill_vintages rewrites without touching observations
+    if table_exists(session, ObservationVintage.__tablename__):
+        vintages, last_id, last_start, closed = session.execute(
+            select(func.count(ObservationVintage.id), func.max(ObservationVintage.id),
+                   func.max(ObservationVintage.realtime_start), func.count(ObservationVintage.realtime_end))
+        ).one()
+        version += f":{vintages}:{last_id}:{last_start}:{closed}"
+    return version
+
+def table_exists(session: Session, name):
+    conn = session.connection()
+    key = (str(conn.engine.url), name)
+    if key in _known_tables:
+        return True
+    if not inspect(conn).has_table(name):
+        return False
+    with _known_tables_lock:
+        _known_tables.add(key)
+    return True
+
+def get_data_version(session: Session):
+    # Version of the data reads are served from: the snapshot's when
+    # DATA_BACKEND=snapshot (no DB round-trip), otherwise the database's
+    from app.services.snapshot import get_snapshot_store
+
+    store = get_snapshot_store()
+    if store is not None:
+        return store.version
+    return get_db_data_version(session)
+
+def get_db_data_version(session: Session):
+    # The stamp ingest stored (a primary-key read), or the aggregate when no
+    # ingest has recorded one yet
+    if table_exists(session, DataVersion.__tablename__):
+        version = session.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar()
+        if version is not None:
+            return version
+    return compute_data_version(session)
+
+def bump_data_version(session: Session):
+    # Called by ingest once its writes are committed
+    version = compute_data_version(session)
+    session.merge(DataVersion(id=1, version=version, updated_at=datetime.utcnow()))
+    session.commit()
+    return version
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Vectorised server-side reduction for chart payloads. Inputs are parallel
+# arrays sorted by date: `dates` as datetime64[D], `values` as float64 (NaN = missing).
+
+FREQUENCIES = ("weekly", "monthly", "quarterly")
+AGGREGATIONS = ("last", "mean", "min", "max")
+
+def _buckets(dates, freq):
+    # Integer period id per observation plus the period's start date label
+    if freq == "weekly":
+        # Monday-based weeks; the epoch (1970-01-01) is a Thursday
+        days = dates.astype(np.int64)
+        ids = (days + 3) // 7
+        return ids, lambda b: (b * 7 - 3).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if freq == "monthly":
+        return months, lambda b: b.astype("datetime64[M]").astype("datetime64[D]")
+    if freq == "quarterly":
+        return months // 3, lambda b: (b * 3).astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unsupported frequency '{freq}'")
+
+def resample(dates, values, freq, agg="last"):
+    # Aggregates to one point per period, labelled with the period start
+    # (FRED's convention). Missing values are ignored; empty periods are dropped.
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation '{agg}'")
+
+    mask = ~np.isnan(values)
+    dates, values = dates[mask], values[mask]
+    if len(values) == 0:
+        return dates, values
+
+    ids, label = _buckets(dates, freq)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+    ends = np.concatenate((starts[1:], [len(values)]))
+
+    if agg == "last":
+        out = values[ends - 1]
+    elif agg == "mean":
+        out = np.add.reduceat(values, starts) / (ends - starts)
+    elif agg == "min":
+        out = np.minimum.reduceat(values, starts)
+    else:
+        out = np.maximum.reduceat(values, starts)
+
+    return label(ids[starts]), out
+
+def lttb(dates, values, max_points):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, for
+    # each interior bucket, the point forming the largest triangle with the
+    # previously kept point and the next bucket's average.
+    mask = ~np.isnan(values)
+    dates, values = dates[mask], values[mask]
+    n = len(values)
+    if max_points >= n or max_points < 3:
+        return dates, values
+
+    x = dates.astype(np.int64).astype(np.float64)
+    y = values
+    # max_points - 2 interior buckets over points 1..n-2, as [edges[i], edges[i+1])
+    k = max_points - 1
+    edges = 1 + (np.arange(k, dtype=np.int64) * (n - 2)) // (k - 1)
+
+    # Next-bucket averages for every interior bucket, computed up front
+    sums_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sums_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    keep[-1] = n - 1
+
+    return dates[keep], values[keep]
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated pool for CPU-bound model work (predict_proba, SHAP) so it can never
+# occupy Starlette's shared threadpool and starve the read endpoints.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE = int(os.environ.get("INFERENCE_QUEUE", "16"))
+
+# Pool for the CPU-bound half of the async read endpoints (formatting rows,
+# resample/LTTB, JSON encoding), so a long series never runs on the event loop
+BUILD_WORKERS = int(os.environ.get("BUILD_WORKERS", "4"))
+BUILD_QUEUE = int(os.environ.get("BUILD_QUEUE", "64"))
+
+# Shadow scoring of served requests with the candidate model. Samples are
+# dropped rather than queued once it falls behind.
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", "1"))
+SHADOW_QUEUE = int(os.environ.get("SHADOW_QUEUE", "8"))
+
+class ExecutorSaturated(Exception):
+    pass
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _reserve(self):
+        # Rejects instead of queueing without bound once workers + queue are full
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def _job(self, fn, args, context):
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.running += 1
+                self.wait_seconds += started - submitted
+            ok = False
+            try:
+                result = context.run(fn, *args)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.pending -= 1
+                    self.run_seconds += time.perf_counter() - started
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+        return job
+
+    async def run(self, fn, *args):
+        if not self._reserve():
+            raise ExecutorSaturated(f"{self.name} executor is saturated")
+        # run_in_executor doesn't carry context variables (request stage timings)
+        job = self._job(fn, args, contextvars.copy_context())
+        return await asyncio.get_running_loop().run_in_executor(self._pool, job)
+
+    def submit(self, fn, *args):
+        # Fire-and-forget for work no response waits on. Runs outside the
+        # caller's context, so it never lands in a request's stage timings.
+        # Returns False (and drops the work) when saturated.
+        if not self._reserve():
+            return False
+        self._pool.submit(self._job(fn, args, contextvars.Context()))
+        return True
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self.wait_seconds / finished * 1000) if finished else 0.0,
+                "avg_run_ms": (self.run_seconds / finished * 1000) if finished else 0.0,
+            }
+
+inference_executor = BoundedExecutor("inference", INFERENCE_WORKERS, INFERENCE_QUEUE)
+build_executor = BoundedExecutor("build", BUILD_WORKERS, BUILD_QUEUE)
+shadow_executor = BoundedExecutor("shadow", SHADOW_WORKERS, SHADOW_QUEUE)
@@ -0,0 +1,440 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from app.db.models import MonthlyFeature, MonthlyFeatureState, Observation, ObservationVintage, Series
+from app.services.data_version import get_data_version, get_db_data_version, table_exists
+from app.services.instrumentation import stage
+from app.services.snapshot import get_snapshot_store
+
+LEVEL_SERIES = [
+    "PAYEMS", "AHETPI", "PCE", "DSPIC96", "CPIAUCSL", "CPILFESL",
+    "M2REAL", "WM2NS", "INDPRO", "IPMAN", "HOUST", "PERMIT",
+    "WPSFD49207"
+]
+
+YOY_PERIODS = 12
+
+# Rows per chunk when streaming observations out of the database
+READ_CHUNK_ROWS = int(os.environ.get("READ_CHUNK_ROWS", "100000"))
+
+# Trailing months re-read from the DB when the data version moves. This picks up
+# new months plus late prints / revisions to recent ones without touching history.
+REFRESH_MONTHS = int(os.environ.get("FEATURE_REFRESH_MONTHS", "3"))
+
+# As-of matrices rebuilt from observation_vintages, kept per (data version,
+# as-of date)
+AS_OF_CACHE_SIZE = int(os.environ.get("AS_OF_CACHE_SIZE", "32"))
+
+_matrix = None
+_lock = threading.Lock()
+_as_of = OrderedDict()
+_as_of_lock = threading.Lock()
+
+# Wide month-end matrix stored as columnar float64 arrays. `levels` holds the
+# forward-filled month-end value of every raw series, `values` the model
+# features derived from it: level series become `<id>_YoY`, the rest pass through.
+class FeatureMatrix:
+    def __init__(self, index, series, levels, version, values=None):
+        self.index = index
+        self.series = list(series)
+        self.levels = np.asfortranarray(levels, dtype=np.float64)
+        self.version = version
+        self.columns = feature_columns(self.series)
+        self._positions = {c: i for i, c in enumerate(self.columns)}
+        if values is None:
+            values = np.empty((len(index), len(self.columns)), dtype=np.float64, order="F")
+            _derive(self.levels, self.series, values, 0)
+        self.values = values
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self):
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
+
+    def select(self, columns, rows=slice(None)):
+        # Aligns to `columns` (e.g. model.feature_names_in_); unknown features are NaN.
+        index = self.index[rows]
+        out = np.full((len(index), len(columns)), np.nan)
+        for j, col in enumerate(columns):
+            i = self._positions.get(col)
+            if i is not None:
+                out[:, j] = self.values[rows, i]
+        return pd.DataFrame(out, index=index, columns=list(columns))
+
+    def latest(self, columns):
+        return self.select(columns, rows=slice(-1, None))
+
+def feature_columns(series):
+    # Same ordering the original pandas pipeline produced: passthrough series
+    # first, then one YoY column per level series.
+    series = list(series)
+    return [s for s in series if s not in LEVEL_SERIES] + [f"{s}_YoY" for s in series if s in LEVEL_SERIES]
+
+def _derive(levels, series, values, start):
+    # Fill feature rows [start:] in place from the level matrix.
+    passthrough = [i for i, s in enumerate(series) if s not in LEVEL_SERIES]
+    level_cols = [i for i, s in enumerate(series) if s in LEVEL_SERIES]
+
+    values[start:, :len(passthrough)] = levels[start:, passthrough]
+    if not level_cols:
+        return
+
+    yoy = values[start:, len(passthrough):]
+    yoy[:] = np.nan
+    first = max(start, YOY_PERIODS)
+    if first >= len(levels):
+        return
+    cur = levels[first:, level_cols]
+    prev = levels[first - YOY_PERIODS:len(levels) - YOY_PERIODS, level_cols]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoy[first - start:] = cur / prev - 1
+
+def load_monthly_levels(session: Session, start=None):
+    store = get_snapshot_store()
+    if store is not None:
+        with stage("pivot_resample"):
+            return store.monthly_levels(start)
+    return read_monthly_levels(session, start)
+
+def read_monthly_levels(session: Session, start=None):
+    # Month-end levels straight from the observations table
+    query = select(Observation.date, Observation.series_id, Observation.value)
+    if start is not None:
+        query = query.where(Observation.date >= start)
+    return _stream_month_end(session, query)
+
+def _chunk_month_end(chunk):
+    # One chunk of (date, series_id, value) rows in (series_id, date) order,
+    # dates already datetime64 -> its last non-null value per series and month
+    chunk = pd.DataFrame({
+        "series_id": chunk["series_id"].astype("category"),
+        "date": chunk["date"],
+        "value": chunk["value"].astype(np.float64),
+    })
+    chunk = chunk[chunk["value"].notna()]
+    chunk["month"] = chunk["date"] + pd.offsets.MonthEnd(0)
+    return chunk.drop_duplicates(["series_id", "month"], keep="last")
+
+def _stream_month_end(session: Session, query):
+    # Same result as _month_end(pd.read_sql(query)), but the rows are streamed
+    # in READ_CHUNK_ROWS chunks (a server-side cursor where the driver has one)
+    # and each chunk is reduced to month-end values before the next is read,
+    # so peak memory follows the monthly output rather than the row count.
+    # Values stay float64 so every path feeds the model identical inputs.
+    query = query.order_by(query.selected_columns.series_id, query.selected_columns.date)
+    partials = []
+    series = {}
+    first = last = None
+    with stage("db_fetch"):
+        with session.bind.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(query, conn, chunksize=READ_CHUNK_ROWS):
+                if chunk.empty:
+                    continue
+                # The month range and the columns include rows whose value is missing
+                chunk["date"] = dates = pd.to_datetime(chunk["date"]).astype("datetime64[s]")
+                first = dates.min() if first is None else min(first, dates.min())
+                last = dates.max() if last is None else max(last, dates.max())
+                series.update(dict.fromkeys(chunk["series_id"].unique()))
+                partials.append(_chunk_month_end(chunk))
+
+    if first is None:
+        return None
+
+    with stage("pivot_resample"):
+        # A month can straddle two chunks; the later chunk has the later date
+        monthly = pd.concat(partials, ignore_index=True)
+        monthly["series_id"] = monthly["series_id"].astype(str)
+        monthly = monthly.drop_duplicates(["series_id", "month"], keep="last")
+        levels = monthly.pivot(index="month", columns="series_id", values="value")
+        index = pd.date_range(first + pd.offsets.MonthEnd(0), last + pd.offsets.MonthEnd(0), freq="ME",
+                              name="date", unit=first.unit)
+        levels = levels.reindex(index=index, columns=sorted(series))
+        levels.columns.name = "series_id"
+        return levels
+
+def _month_end(df):
+    # Long (date, series_id, value) rows -> month-end level per series
+    if df.empty:
+        return None
+
+    with stage("pivot_resample"):
+        df_pivot = df.pivot(index="date", columns="series_id", values="value")
+        df_pivot.index = pd.to_datetime(df_pivot.index)
+        df_pivot.sort_index(inplace=True)
+
+        return df_pivot.resample('ME').last()
+
+def _vintage_query(as_of=None, start=None):
+    # With as_of, keeps the vintage of each observation that was current on
+    # that date; observations dated after it were not published yet. The
+    # series_id IN (...) lets the planner range-scan ix_observation_vintages_asof
+    # per series instead of scanning the table.
+    query = select(ObservationVintage.date, ObservationVintage.series_id, ObservationVintage.value).where(
+        ObservationVintage.series_id.in_(select(Series.series_id))
+    )
+    if as_of is None:
+        query = query.add_columns(ObservationVintage.realtime_start, ObservationVintage.realtime_end)
+    else:
+        query = query.where(
+            ObservationVintage.date <= as_of,
+            ObservationVintage.realtime_start <= as_of,
+            or_(ObservationVintage.realtime_end.is_(None), ObservationVintage.realtime_end > as_of),
+        )
+    if start is not None:
+        query = query.where(ObservationVintage.date >= start)
+    return query
+
+def _require_vintages(session: Session):
+    if not table_exists(session, ObservationVintage.__tablename__):
+        raise ValueError("No point-in-time data: run scripts.init_db to create observation_vintages")
+
+def read_vintage_levels(session: Session, as_of, start=None):
+    # Month-end levels as they were known on `as_of`, from one query
+    _require_vintages(session)
+    return _stream_month_end(session, _vintage_query(as_of, start))
+
+def read_vintages(session: Session, start=None):
+    # Every vintage row, for callers reconstructing many as-of dates in memory
+    # (see vintage_levels). Read in chunks and held in compact dtypes.
+    _require_vintages(session)
+    chunks = []
+    with stage("db_fetch"):
+        with session.bind.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(_vintage_query(None, start), conn, chunksize=READ_CHUNK_ROWS):
+                chunk["series_id"] = chunk["series_id"].astype("category")
+                for col in ("date", "realtime_start", "realtime_end"):
+                    chunk[col] = pd.to_datetime(chunk[col]).astype("datetime64[s]")
+                chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=["date", "series_id", "value", "realtime_start", "realtime_end"])
+    df = pd.concat(chunks, ignore_index=True)
+    df["series_id"] = df["series_id"].astype("category")
+    return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+def vintage_levels(vintages, as_of, start=None):
+    # read_vintage_levels over a frame from read_vintages
+    as_of = pd.Timestamp(as_of)
+    dates = vintages["date"].to_numpy()
+    lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="left"))
+    hi = int(np.searchsorted(dates, np.datetime64(as_of), side="right"))
+    window = vintages.iloc[lo:hi]
+    end = window["realtime_end"]
+    current = (window["realtime_start"] <= as_of) & (end.isna() | (end > as_of))
+    return _month_end(window.loc[current, ["date", "series_id", "value"]])
+
+def through_month(levels, as_of):
+    # Pads month-end levels out to the month containing `as_of`, so an as-of
+    # matrix always ends in that month even when nothing was printed in it yet
+    if levels is None:
+        return None
+    end = pd.Timestamp(as_of) + pd.offsets.MonthEnd(0)
+    if levels.index[-1] >= end:
+        return levels
+    return levels.reindex(pd.date_range(levels.index[0], end, freq="ME"))
+
+def _from_levels(df_monthly, version):
+    if df_monthly is None:
+        return None
+    df_monthly = df_monthly.ffill()
+    return FeatureMatrix(df_monthly.index, df_monthly.columns, df_monthly.to_numpy(dtype=np.float64), version)
+
+def build_feature_matrix(session: Session, version=None, use_table=True):
+    # Reads the monthly_features table when it is current for `version`,
+    # otherwise derives everything from the raw observations
+    if version is None:
+        version = get_data_version(session)
+
+    if use_table and get_snapshot_store() is None:
+        matrix = load_feature_table(session, version)
+        if matrix is not None:
+            return matrix
+
+    return _from_levels(load_monthly_levels(session), version)
+
+def _extend(session: Session, matrix: FeatureMatrix, version, keep, loader):
+    # Splice levels re-read from month `keep` onwards onto the cached history
+    # and derive features for the affected rows. None means rebuild instead.
+    if keep >= len(matrix) or keep < 1:
+        return None
+
+    tail_start = matrix.index[keep].replace(day=1).date()
+    tail = loader(session, start=tail_start)
+    if tail is None or tail.index[-1] < matrix.index[-1]:
+        # Data went backwards (deleted rows / truncated series); start over.
+        return None
+
+    series = sorted(set(matrix.series) | set(tail.columns))
+    if series != matrix.series:
+        # A new series needs its full history, not just the re-read tail,
+        # and shifts every feature column; rebuild.
+        return None
+    index = pd.date_range(matrix.index[keep], tail.index[-1], freq="ME")
+
+    head = pd.DataFrame(matrix.levels[:keep], index=matrix.index[:keep], columns=series)
+    tail = tail.reindex(index=index, columns=series)
+
+    # Seed the forward fill with the last cached month so sparse series carry over
+    seeded = pd.concat([head.iloc[-1:], tail]).ffill().iloc[1:]
+    levels = np.concatenate([head.to_numpy(dtype=np.float64), seeded.to_numpy(dtype=np.float64)])
+
+    values = np.empty((len(levels), len(matrix.columns)), dtype=np.float64, order="F")
+    values[:keep] = matrix.values[:keep]
+    levels = np.asfortranarray(levels)
+    _derive(levels, series, values, keep)
+    return FeatureMatrix(head.index.append(index), series, levels, version, values=values)
+
+def extend_feature_matrix(session: Session, matrix: FeatureMatrix, version):
+    # Re-read only the trailing REFRESH_MONTHS
+    keep = max(len(matrix) - REFRESH_MONTHS, YOY_PERIODS)
+    extended = _extend(session, matrix, version, keep, load_monthly_levels)
+    if extended is None:
+        return build_feature_matrix(session, version, use_table=False)
+    return extended
+
+def load_feature_table(session: Session, version=None):
+    # The monthly_features rows as a FeatureMatrix, or None when the table is
+    # missing, empty or (given a version) refreshed for a different one. Read
+    # on the session's connection, so a refresh not yet committed is visible.
+    if not table_exists(session, MonthlyFeature.__tablename__):
+        return None
+    stored = session.execute(
+        select(MonthlyFeatureState.version).where(MonthlyFeatureState.id == 1)
+    ).scalar()
+    if stored is None or (version is not None and stored != version):
+        return None
+
+    with stage("db_fetch"):
+        df = pd.read_sql(
+            select(MonthlyFeature.month, MonthlyFeature.series_id, MonthlyFeature.level, MonthlyFeature.value),
+            session.connection()
+        )
+    if df.empty:
+        return None
+
+    with stage("pivot_resample"):
+        levels = df.pivot(index="month", columns="series_id", values="level").sort_index()
+        values = df.pivot(index="month", columns="series_id", values="value").sort_index()
+    series = list(levels.columns)
+    # Feature columns are the passthrough series, then the YoY of each level series
+    order = [s for s in series if s not in LEVEL_SERIES] + [s for s in series if s in LEVEL_SERIES]
+    index = pd.DatetimeIndex(pd.to_datetime(levels.index), freq="ME", name="date")
+
+    return FeatureMatrix(
+        index, series, levels.to_numpy(dtype=np.float64), stored,
+        values=np.asfortranarray(values[order].to_numpy(dtype=np.float64))
+    )
+
+def _table_rows(matrix: FeatureMatrix, start):
+    months = [ts.date() for ts in matrix.index[start:]]
+    rows = []
+    for j, sid in enumerate(matrix.series):
+        column = matrix._positions[f"{sid}_YoY" if sid in LEVEL_SERIES else sid]
+        levels = matrix.levels[start:, j].tolist()
+        values = matrix.values[start:, column].tolist()
+        for month, level, value in zip(months, levels, values):
+            rows.append({
+                "month": month,
+                "series_id": sid,
+                "level": None if math.isnan(level) else level,
+                "value": None if math.isnan(value) else value
+            })
+    return rows
+
+def refresh_feature_table(session: Session, since=None, version=None, base_version=None, commit=True):
+    # Brings monthly_features up to date with the observations table. With
+    # `since` (the earliest observation date ingest touched) only months from
+    # there on are recomputed and rewritten, provided the table was current for
+    # `base_version` (the data version before those writes); otherwise the
+    # table is rebuilt. Always reads the database, never the snapshot.
+    # commit=False leaves the writes to the caller's transaction, so they go
+    # out together with the data version they belong to.
+    # Returns the number of months written.
+    if version is None:
+        version = get_db_data_version(session)
+
+    current = load_feature_table(session, base_version) if since is not None else None
+    matrix = None
+    start = 0
+    if current is not None:
+        month_end = pd.Timestamp(since) + pd.offsets.MonthEnd(0)
+        keep = min(int(current.index.searchsorted(month_end)), len(current) - 1)
+        if keep >= YOY_PERIODS:
+            matrix = _extend(session, current, version, keep, read_monthly_levels)
+        if matrix is not None:
+            start = keep
+
+    if matrix is None:
+        matrix = _from_levels(read_monthly_levels(session), version)
+
+    table = MonthlyFeature.__table__
+    if start:
+        session.execute(table.delete().where(table.c.month >= matrix.index[start].date()))
+    else:
+        session.execute(table.delete())
+    if matrix is not None:
+        session.execute(table.insert(), _table_rows(matrix, start))
+    session.merge(MonthlyFeatureState(id=1, version=version, updated_at=datetime.utcnow()))
+    if commit:
+        session.commit()
+    return 0 if matrix is None else len(matrix) - start
+
+def get_feature_matrix(session: Session, full=False):
+    # Process-wide cache keyed by data version. full=True rebuilds from every
+    # stored observation. Otherwise a new version is read from the
+    # monthly_features table when ingest has refreshed it, or by re-reading
+    # only the trailing months.
+    global _matrix
+    version = get_data_version(session)
+
+    with _lock:
+        if _matrix is not None and _matrix.version == version and not full:
+            return _matrix
+
+        with stage("feature_build"):
+            if _matrix is None or full:
+                matrix = build_feature_matrix(session, version, use_table=not full)
+            else:
+                matrix = None
+                if get_snapshot_store() is None:
+                    matrix = load_feature_table(session, version)
+                if matrix is None:
+                    matrix = extend_feature_matrix(session, _matrix, version)
+
+        _matrix = matrix
+        return matrix
+
+def get_feature_matrix_as_of(session: Session, as_of, months=2 * YOY_PERIODS):
+    # The trailing `months` of the feature matrix as it stood on `as_of` (a
+    # date), ending in the month that contains it; enough history for the
+    # YoY features of the last row. Raises ValueError without point-in-time data.
+    if as_of > date.today():
+        raise ValueError(f"as_of {as_of} is in the future")
+    if as_of == date.today():
+        # Ingest records today's prints as today's vintage before the version
+        # covering them is published, so only earlier dates are settled
+        raise ValueError(f"as_of must be before today ({as_of}); omit it for the latest score")
+    key = (get_db_data_version(session), as_of, months)
+    with _as_of_lock:
+        matrix = _as_of.get(key)
+        if matrix is not None:
+            _as_of.move_to_end(key)
+            return matrix
+
+    with stage("feature_build"):
+        start = (pd.Timestamp(as_of) - pd.offsets.MonthBegin(months + 1)).date()
+        levels = through_month(read_vintage_levels(session, as_of, start=start), as_of)
+        matrix = _from_levels(levels, f"{key[0]}@{as_of}")
+    if matrix is None:
+        return None
+    with _as_of_lock:
+        _as_of[key] = matrix
+        while len(_as_of) > AS_OF_CACHE_SIZE:
+            _as_of.popitem(last=False)
+    return matrix
@@ -0,0 +1,247 @@
+import hashlib
+import numpy as np
+
+# Flat, dependency-free form of a fitted sklearn tree ensemble for serving.
+#
+# Traversal arrays (one row per node, trees concatenated):
+#   feature, threshold, left, right, missing_left, value
+# Leaves point left/right at themselves so every row can be walked for a fixed
+# number of steps without branching on leaf-ness.
+#
+# TreeSHAP arrays (one row per leaf, padded to the deepest path's number of
+# distinct features D):
+#   leaf_feature, leaf_lo, leaf_hi, leaf_q, leaf_value
+# A leaf contributes v * prod_{f in S} s_f * prod_{f not in S} q_f to the
+# path-dependent value function, where s_f = [lo_f < x_f <= hi_f] and q_f is the
+# product of cover ratios along the path for that feature. Shapley values of
+# that product game are
+#   phi_j = v * (s_j - q_j) * integral_0^1 prod_{m != j} (s_m t + q_m (1 - t)) dt
+# The integrand is a polynomial of degree < D, so Gauss-Legendre quadrature with
+# ceil(D / 2) nodes is exact. Padding slots use s = q = 1 (factor 1, phi 0).
+
+FORMAT_VERSION = 1
+
+def file_digest(path):
+    # Ties an exported forest to the exact model file it was compiled from
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _leaf_paths(tree):
+    t = tree.tree_
+    left, right = t.children_left, t.children_right
+    feature, threshold = t.feature, t.threshold
+    cover = t.weighted_n_node_samples
+
+    leaves = []
+    stack = [(0, {})]
+    while stack:
+        node, conds = stack.pop()
+        if left[node] == -1:
+            leaves.append((node, conds))
+            continue
+        f = int(feature[node])
+        for child, goes_left in ((left[node], True), (right[node], False)):
+            lo, hi, q = conds.get(f, (-np.inf, np.inf, 1.0))
+            if goes_left:
+                hi = min(hi, threshold[node])
+            else:
+                lo = max(lo, threshold[node])
+            child_conds = dict(conds)
+            child_conds[f] = (lo, hi, q * cover[child] / cover[node])
+            stack.append((child, child_conds))
+    return leaves
+
+def flatten_forest(model, class_index=1):
+    # Returns the dict of arrays that CompiledForest is built from
+    feature, threshold, left, right, missing_left, value = [], [], [], [], [], []
+    leaf_rows = []
+    offset = 0
+    max_depth = 0
+    expected = 0.0
+
+    for est in model.estimators_:
+        t = est.tree_
+        n = t.node_count
+        probs = t.value[:, 0, :] / t.value[:, 0, :].sum(axis=1, keepdims=True)
+        node_value = probs[:, class_index]
+        is_leaf = t.children_left == -1
+        local = np.arange(n)
+
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(np.where(is_leaf, 0.0, t.threshold))
+        left.append(np.where(is_leaf, local, t.children_left) + offset)
+        right.append(np.where(is_leaf, local, t.children_right) + offset)
+        mgl = getattr(t, "missing_go_to_left", None)
+        missing_left.append(np.zeros(n, dtype=bool) if mgl is None else mgl.astype(bool))
+        value.append(node_value)
+
+        cover = t.weighted_n_node_samples
+        expected += float((node_value[is_leaf] * cover[is_leaf]).sum() / cover[0])
+        max_depth = max(max_depth, int(t.max_depth))
+
+        for leaf, conds in _leaf_paths(est):
+            leaf_rows.append((node_value[leaf], sorted(conds.items())))
+        offset += n
+
+    n_trees = len(model.estimators_)
+    depth = max(1, max(len(conds) for _, conds in leaf_rows))
+    n_leaves = len(leaf_rows)
+
+    leaf_feature = np.zeros((n_leaves, depth), dtype=np.int32)
+    leaf_lo = np.full((n_leaves, depth), -np.inf)
+    leaf_hi = np.full((n_leaves, depth), np.inf)
+    leaf_q = np.ones((n_leaves, depth))
+    leaf_pad = np.ones((n_leaves, depth), dtype=bool)
+    leaf_value = np.empty(n_leaves)
+    for i, (v, conds) in enumerate(leaf_rows):
+        leaf_value[i] = v
+        for j, (f, (lo, hi, q)) in enumerate(conds):
+            leaf_feature[i, j] = f
+            leaf_lo[i, j] = lo
+            leaf_hi[i, j] = hi
+            leaf_q[i, j] = q
+            leaf_pad[i, j] = False
+
+    return {
+        "format_version": np.array(FORMAT_VERSION),
+        "feature_names": np.array([str(f) for f in model.feature_names_in_]),
+        "n_trees": np.array(n_trees),
+        "max_depth": np.array(max_depth),
+        "expected_value": np.array(expected / n_trees),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "missing_left": np.concatenate(missing_left),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.cumsum([0] + [e.tree_.node_count for e in model.estimators_[:-1]]).astype(np.int32),
+        "leaf_feature": leaf_feature,
+        "leaf_lo": leaf_lo,
+        "leaf_hi": leaf_hi,
+        "leaf_q": leaf_q,
+        "leaf_pad": leaf_pad,
+        "leaf_value": leaf_value,
+    }
+
+def export_forest(model, path, class_index=1, source_digest=""):
+    arrays = flatten_forest(model, class_index=class_index)
+    arrays["source_digest"] = np.array(source_digest)
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    return CompiledForest(arrays)
+
+class CompiledForest:
+    def __init__(self, arrays):
+        self.feature_names = [str(f) for f in arrays["feature_names"]]
+        self.n_trees = int(arrays["n_trees"])
+        self.max_depth = int(arrays["max_depth"])
+        self.expected_value = float(arrays["expected_value"])
+        self.source_digest = str(arrays["source_digest"]) if "source_digest" in arrays else ""
+
+        self.feature = np.ascontiguousarray(arrays["feature"])
+        self.threshold = np.ascontiguousarray(arrays["threshold"])
+        self.left = np.ascontiguousarray(arrays["left"])
+        self.right = np.ascontiguousarray(arrays["right"])
+        self.missing_left = np.ascontiguousarray(arrays["missing_left"])
+        self.value = np.ascontiguousarray(arrays["value"])
+        self.roots = np.ascontiguousarray(arrays["roots"])
+
+        self.leaf_feature = arrays["leaf_feature"]
+        self.leaf_lo = arrays["leaf_lo"]
+        self.leaf_hi = arrays["leaf_hi"]
+        self.leaf_value = arrays["leaf_value"]
+        pad = arrays["leaf_pad"]
+        # Padding slots must act as the constant 1 in the product
+        self.leaf_q = np.where(pad, 1.0, arrays["leaf_q"])
+        self.leaf_pad = pad
+
+        n_leaves, depth = self.leaf_feature.shape
+        nodes, weights = np.polynomial.legendre.leggauss(max(1, (depth + 1) // 2))
+        t = (nodes + 1) / 2
+        self._t = t
+        self._w = weights / 2
+
+        # Each slot's factor s t + q (1 - t) at every quadrature node, for the
+        # two possible values of s. The full product is linear in s after a
+        # log, and dropping slot j is a multiply by 1 / g_j, so with v and q
+        # folded in up front phi_j = A_j @ full + s_j * (B_j @ full) where
+        #   A_j = -v q_j / g0_j,  B_j = v (1 / g0_j + (1 - q_j) (1 / g1_j - 1 / g0_j))
+        # No (rows, leaves, slots, nodes) temporary is ever materialised.
+        q = self.leaf_q[..., None]
+        v = self.leaf_value[:, None, None]
+        g1 = q * (1 - t) + t                                             # (L, D, R)
+        g0 = np.where(pad[..., None], 1.0, q * (1 - t))
+        self._log_g0 = np.log(g0).sum(axis=1)[..., None]                 # (L, R, 1)
+        self._log_ratio = (np.log(g1) - np.log(g0)).transpose(0, 2, 1).copy()  # (L, R, D)
+        a = -v * q / g0
+        b = v * (1 / g0 + (1 - q) * (1 / g1 - 1 / g0))
+        self._ab = np.concatenate([a, b], axis=1)                        # (L, 2D, R)
+        self._w_col = self._w[:, None]
+        self._lo = self.leaf_lo[..., None]
+        self._hi = self.leaf_hi[..., None]
+
+        # Scatters per-(leaf, slot) contributions onto model features
+        n_features = len(self.feature_names)
+        self._scatter = np.zeros((n_features, n_leaves * depth))
+        flat = self.leaf_feature.ravel()
+        live = ~pad.ravel()
+        self._scatter[flat[live], np.flatnonzero(live)] = 1.0 / self.n_trees
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported forest format {int(data['format_version'])} in {path}")
+            return cls({k: data[k] for k in data.files})
+
+    def _as_array(self, X):
+        # sklearn compares float32 inputs against float64 thresholds; match it
+        if hasattr(X, "reindex"):
+            X = X.reindex(columns=self.feature_names)
+        return np.asarray(X, dtype=np.float32)
+
+    def predict_proba(self, X):
+        # P(class) per row, averaged over trees like RandomForestClassifier
+        X = self._as_array(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].mean(axis=1)
+
+    def shap_values(self, X, max_elements=2_000_000):
+        # Exact path-dependent TreeSHAP for the same class as predict_proba.
+        # Rows satisfy expected_value + phi.sum(axis=1) == predict_proba(X).
+        # Inputs must not contain NaN (callers fill missing features first).
+        X = self._as_array(X).astype(np.float64)
+        n_leaves, depth = self.leaf_feature.shape
+        per_row = n_leaves * depth * len(self._t)
+        chunk = max(1, max_elements // per_row)
+
+        out = np.empty((len(X), len(self.feature_names)))
+        for start in range(0, len(X), chunk):
+            out[start:start + chunk] = self._shap_chunk(X[start:start + chunk])
+        return out
+
+    def _shap_chunk(self, X):
+        # Rows are kept as the innermost axis throughout. Padding slots have
+        # infinite bounds, so they always land in s = 1.
+        n_leaves, depth = self.leaf_feature.shape
+        xs = X.T[self.leaf_feature]                                      # (L, D, n)
+        s = ((xs > self._lo) & (xs <= self._hi)).astype(np.float64)
+
+        full = self._log_ratio @ s                                       # (L, R, n)
+        full += self._log_g0
+        np.exp(full, out=full)
+        full *= self._w_col
+
+        ab = self._ab @ full                                             # (L, 2D, n)
+        phi = ab[:, depth:]
+        phi *= s
+        phi += ab[:, :depth]
+        return (self._scatter @ phi.reshape(-1, len(X))).T
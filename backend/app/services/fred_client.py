@@ -0,0 +1,145 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Override to point ingest at a local stub (see scripts/fred_stub.py)
+FRED_API_URL = os.environ.get("FRED_API_URL", "https://api.stlouisfed.org/fred")
+
+# FRED allows 120 requests per minute per API key
+DEFAULT_RATE_PER_MINUTE = float(os.environ.get("FRED_RATE_LIMIT", "120"))
+DEFAULT_BURST = int(os.environ.get("FRED_RATE_BURST", "60"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Real-time bounds FRED uses for "all vintages" / "still current"
+EARLIEST_REALTIME = "1776-07-04"
+LATEST_REALTIME = "9999-12-31"
+
+class TokenBucket:
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class FredClient:
+    # Thread-safe FRED JSON client: one pooled HTTP session shared by all
+    # workers, a token bucket in front of every request and retry with
+    # exponential backoff on throttling / server errors.
+    def __init__(self, api_key, base_url=FRED_API_URL, rate_per_minute=DEFAULT_RATE_PER_MINUTE,
+                 burst=DEFAULT_BURST, pool_size=16, max_retries=5, backoff=0.5, timeout=30):
+        if not api_key:
+            raise RuntimeError("Missing FRED api key")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def _get(self, path, **params):
+        params.update(api_key=self.api_key, file_type="json")
+        url = f"{self.base_url}/{path}"
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                resp = self.http.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = resp.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else self._delay(attempt)
+                time.sleep(delay)
+                continue
+
+            if resp.status_code != 200:
+                try:
+                    message = resp.json().get("error_message", resp.text)
+                except ValueError:
+                    message = resp.text
+                raise ValueError(f"FRED {path} failed ({resp.status_code}): {message}")
+            return resp.json()
+
+    def _delay(self, attempt):
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def get_series_info(self, series_id):
+        data = self._get("series", series_id=series_id)
+        seriess = data.get("seriess") or []
+        if not seriess:
+            raise ValueError(f"No series info for {series_id}")
+        return seriess[0]
+
+    def get_observations(self, series_id, observation_start=None):
+        # Returns [(date_str, value_or_None)] in date order; FRED marks missing values with "."
+        params = {"series_id": series_id}
+        if observation_start is not None:
+            params["observation_start"] = str(observation_start)
+        data = self._get("series/observations", **params)
+        return [
+            (o["date"], None if o["value"] == "." else float(o["value"]))
+            for o in data.get("observations", [])
+        ]
+
+    def get_series_release(self, series_id):
+        # The release (publication) a series comes out in: {"id", "name", ...}
+        releases = self._get("series/release", series_id=series_id).get("releases") or []
+        if not releases:
+            raise ValueError(f"No release for {series_id}")
+        return releases[0]
+
+    def get_release_dates(self, release_id, start):
+        # Scheduled publication dates of a release from `start` on, ascending;
+        # FRED lists future dates only with include_release_dates_with_no_data
+        data = self._get("release/dates", release_id=release_id, realtime_start=str(start),
+                         realtime_end=LATEST_REALTIME, include_release_dates_with_no_data="true",
+                         sort_order="asc")
+        return [d["date"] for d in data.get("release_dates", [])]
+
+    def get_observation_vintages(self, series_id, page_size=100000):
+        # Every vintage ALFRED has for the series: [(date_str, value_or_None,
+        # realtime_start_str, realtime_end_str_or_None)]; an open-ended
+        # vintage (realtime_end 9999-12-31) comes back as None
+        out = []
+        offset = 0
+        while True:
+            data = self._get("series/observations", series_id=series_id, realtime_start=EARLIEST_REALTIME,
+                             realtime_end=LATEST_REALTIME, limit=page_size, offset=offset)
+            page = data.get("observations", [])
+            out.extend(
+                (o["date"], None if o["value"] == "." else float(o["value"]), o["realtime_start"],
+                 None if o["realtime_end"] == LATEST_REALTIME else o["realtime_end"])
+                for o in page
+            )
+            offset += len(page)
+            if not page or offset >= int(data.get("count", offset)):
+                return out
+
+    def close(self):
+        self.http.close()
@@ -1,10 +1,24 @@
 import os
+import threading
+import orjson
+import numpy as np
 import pandas as pd
 from datetime import date, timedelta
 from fredapi import Fred
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.db.models import Series, Observation
 from app.lib.series_defs import SERIES_TO_LOAD
+from app.services.data_version import get_data_version
+from app.services.downsample import resample, lttb
+from app.services.executor import build_executor
+from app.services.instrumentation import stage
+from app.services.snapshot import get_snapshot_store
+
+# Outlook percentile cache, see get_series_scores
+_outlook = {"key": None, "stamps": {}, "scores": {}}
+_outlook_lock = threading.Lock()
 
 def _client():
     api_key = os.environ.get("FRED_API_KEY")
@@ -21,37 +35,307 @@ def get_series(series_id, start = None, end = None):
         out.append({"date": str(date), "value": "" if val is None else str(val)})
     return out
 
-def get_series_db(series_id, start=None, end=None, session: Session = None):
-    if session is None:
-        raise ValueError("DB session required to use stored FRED data")
+def _meta_dict(series_id, name, frequency, units, category):
+    return {
+        "seriesId": series_id,
+        "name": name,
+        "frequency": frequency,
+        "units": units,
+        "category": category,
+        "citation": f"FRED, {name}. Retrieved from https://fred.stlouisfed.org/series/{series_id}",
+    }
+
+def _snapshot_meta(store, series_id):
+    meta = store.meta(series_id)
+    if meta is None:
+        raise ValueError(f"Series '{series_id}' not found in snapshot")
+    return _meta_dict(series_id, meta["name"], meta["frequency"], meta["units"], meta["category"])
 
-    series_meta = session.query(Series).filter(Series.series_id == series_id).first()
+def _meta_query(series_id):
+    return select(Series.series_id, Series.name, Series.frequency, Series.units, Series.category).where(
+        Series.series_id == series_id
+    )
+
+def _meta_from_row(series_id, series_meta):
     if not series_meta:
         raise ValueError(f"Series '{series_id}' not found in database")
+    return _meta_dict(series_meta.series_id, series_meta.name, series_meta.frequency, series_meta.units, series_meta.category)
+
+def get_series_meta(series_id, session: Session):
+    store = get_snapshot_store()
+    if store is not None:
+        return _snapshot_meta(store, series_id)
+    return _meta_from_row(series_id, session.execute(_meta_query(series_id)).first())
 
-    query = session.query(Observation).filter(Observation.series_id == series_id)
+async def aget_series_meta(series_id, session: AsyncSession):
+    store = get_snapshot_store()
+    if store is not None:
+        return _snapshot_meta(store, series_id)
+    return _meta_from_row(series_id, (await session.execute(_meta_query(series_id))).first())
+
+def _snapshot_lists(store, series_id, start=None, end=None):
+    # ISO dates and values with None for missing, as the DB path returns them
+    dates, values = store.arrays(series_id, start, end)
+    missing = np.isnan(values)
+    values = values.tolist()
+    for i in np.flatnonzero(missing):
+        values[i] = None
+    return dates.astype(str).tolist(), values
+
+def _observations_query(series_id, start=None, end=None):
+    # Only (date, value) through Core: served straight off the (series_id, date) index
+    query = select(Observation.date, Observation.value).where(Observation.series_id == series_id)
     if start:
-        query = query.filter(Observation.date >= start)
+        query = query.where(Observation.date >= start)
     if end:
-        query = query.filter(Observation.date <= end)
-    query = query.order_by(Observation.date.asc())
+        query = query.where(Observation.date <= end)
+    return query.order_by(Observation.date.asc())
+
+def read_observations(series_id, start, end, session: Session):
+    # The raw (date, value) rows of the range, or None when a snapshot is
+    # being served (build_series then reads the store itself)
+    if get_snapshot_store() is not None:
+        return None
+    with stage("db_fetch"):
+        return session.execute(_observations_query(series_id, start, end)).all()
+
+async def aread_observations(series_id, start, end, session: AsyncSession):
+    if get_snapshot_store() is not None:
+        return None
+    with stage("db_fetch"):
+        return (await session.execute(_observations_query(series_id, start, end))).all()
+
+def _reduce(series_id, rows, start, end, freq=None, agg="last", max_points=None):
+    # Loads the range into arrays and applies period aggregation and/or LTTB.
+    # Returns (iso date strings, float values); missing values are dropped.
+    if rows is None:
+        dates, values = get_snapshot_store().arrays(series_id, start, end)
+    else:
+        dates = np.array([r[0] for r in rows], dtype="datetime64[D]")
+        values = np.array([r[1] for r in rows], dtype=np.float64)
+
+    if freq:
+        dates, values = resample(dates, values, freq, agg)
+    if max_points:
+        dates, values = lttb(dates, values, max_points)
+
+    return dates.astype(str).tolist(), values.tolist()
 
-    observations = [
-        {"date": obs.date.isoformat(), "value": str(obs.value)}
-        for obs in query.all()
-    ]
+def _reduced_observations(series_id, start, end, session: Session, freq=None, agg="last", max_points=None):
+    rows = read_observations(series_id, start, end, session)
+    return _reduce(series_id, rows, start, end, freq, agg, max_points)
 
+def build_series(series_id, meta, rows, fmt="rows", start=None, end=None, freq=None, agg="last", max_points=None):
+    # The CPU-bound half of a /series response, from rows already read by
+    # (a)read_observations: optional reduction, then the "rows" body (list of
+    # string-valued dicts) or the "columnar" one (parallel arrays, numeric
+    # values with null for missing)
+    if freq or max_points:
+        dates, values = _reduce(series_id, rows, start, end, freq, agg, max_points)
+    elif rows is None:
+        dates, values = _snapshot_lists(get_snapshot_store(), series_id, start, end)
+    else:
+        dates = [obs_date.isoformat() for obs_date, _ in rows]
+        values = [value for _, value in rows]
+
+    if fmt == "columnar":
+        return {
+            **meta,
+            "count": len(dates),
+            "dates": dates,
+            "values": values
+        }
     return {
-        "seriesId": series_meta.series_id,
-        "name": series_meta.name,
-        "frequency": series_meta.frequency,
-        "units": series_meta.units,
-        "category": series_meta.category,
-        "citation": f"FRED, {series_meta.name}. Retrieved from https://fred.stlouisfed.org/series/{series_meta.series_id}",
-        "count": len(observations),
-        "series": observations
+        **meta,
+        "count": len(dates),
+        "series": [{"date": d, "value": str(v)} for d, v in zip(dates, values)]
     }
 
+def get_series_db(series_id, start=None, end=None, session: Session = None, freq=None, agg="last", max_points=None):
+    if session is None:
+        raise ValueError("DB session required to use stored FRED data")
+
+    meta = get_series_meta(series_id, session)
+    rows = read_observations(series_id, start, end, session)
+    return build_series(series_id, meta, rows, "rows", start, end, freq, agg, max_points)
+
+def get_series_columnar(series_id, start=None, end=None, session: Session = None, freq=None, agg="last", max_points=None):
+    # Same data as get_series_db as two parallel arrays with numeric values
+    # (missing values are null) instead of a list of string-valued dicts.
+    if session is None:
+        raise ValueError("DB session required to use stored FRED data")
+
+    meta = get_series_meta(series_id, session)
+    rows = read_observations(series_id, start, end, session)
+    return build_series(series_id, meta, rows, "columnar", start, end, freq, agg, max_points)
+
+def iter_series_ndjson(series_id, start=None, end=None, session: Session = None, chunk_size=5000,
+                       freq=None, agg="last", max_points=None):
+    # Newline-delimited JSON: a metadata line followed by one {"date", "value"}
+    # line per observation. Rows come off a server-side cursor in chunks, so
+    # memory stays flat regardless of series length.
+    if session is None:
+        raise ValueError("DB session required to use stored FRED data")
+
+    yield orjson.dumps(get_series_meta(series_id, session)) + b"\n"
+
+    if freq or max_points:
+        # Reduced output is bounded by max_points / number of periods
+        dates, values = _reduced_observations(series_id, start, end, session, freq, agg, max_points)
+        yield b"".join(orjson.dumps({"date": d, "value": v}) + b"\n" for d, v in zip(dates, values))
+        return
+
+    store = get_snapshot_store()
+    if store is not None:
+        yield from _chunked_ndjson(*_snapshot_lists(store, series_id, start, end), chunk_size)
+        return
+
+    query = _observations_query(series_id, start, end).execution_options(stream_results=True, yield_per=chunk_size)
+    for rows in session.execute(query).partitions():
+        yield _ndjson_rows(rows)
+
+async def aiter_series_ndjson(series_id, start=None, end=None, session: AsyncSession = None, chunk_size=5000,
+                              freq=None, agg="last", max_points=None):
+    # asyncio twin of iter_series_ndjson reading through an AsyncSession
+    if session is None:
+        raise ValueError("DB session required to use stored FRED data")
+
+    # Only the reads are awaited here; array work goes to the build executor
+    yield orjson.dumps(await aget_series_meta(series_id, session)) + b"\n"
+
+    if freq or max_points:
+        rows = await aread_observations(series_id, start, end, session)
+        dates, values = await build_executor.run(_reduce, series_id, rows, start, end, freq, agg, max_points)
+        yield b"".join(orjson.dumps({"date": d, "value": v}) + b"\n" for d, v in zip(dates, values))
+        return
+
+    store = get_snapshot_store()
+    if store is not None:
+        dates, values = await build_executor.run(_snapshot_lists, store, series_id, start, end)
+        for chunk in _chunked_ndjson(dates, values, chunk_size):
+            yield chunk
+        return
+
+    query = _observations_query(series_id, start, end).execution_options(yield_per=chunk_size)
+    result = await session.stream(query)
+    async for rows in result.partitions():
+        yield _ndjson_rows(rows)
+
+def _chunked_ndjson(dates, values, chunk_size):
+    for i in range(0, len(dates), chunk_size):
+        yield _ndjson_rows(zip(dates[i:i + chunk_size], values[i:i + chunk_size]))
+
+def _ndjson_rows(rows):
+    return b"".join(
+        orjson.dumps({"date": obs_date, "value": value}) + b"\n"
+        for obs_date, value in rows
+    )
+
+def _series_percentiles(session: Session, series_ids, start_date):
+    # Percentile of each series' latest value within its own window, for all
+    # requested series in one grouped pass: rank(method="max") is the count of
+    # values <= x, so the last row's pct rank is the outlook percentile.
+    query = select(Observation.series_id, Observation.date, Observation.value).where(
+        Observation.series_id.in_(series_ids),
+        Observation.date >= start_date,
+        Observation.value.is_not(None)
+    ).order_by(Observation.series_id, Observation.date)
+
+    with stage("db_fetch"):
+        df = pd.read_sql(query, session.bind)
+    df = df.dropna(subset=["value"])
+    if df.empty:
+        return {}
+
+    with stage("percentiles"):
+        grouped = df.groupby("series_id", sort=False)["value"]
+        ranks = grouped.rank(method="max", pct=True)
+        last = grouped.tail(1).index
+        return dict(zip(df.loc[last, "series_id"], ranks.loc[last] * 100))
+
+def _db_stamps(session: Session, series_ids, start_date):
+    # (count, max date, sum) per series in the window, in one grouped query
+    conditions = [Observation.series_id.in_(series_ids), Observation.date >= start_date]
+    if session.bind.dialect.name == "postgresql":
+        # Missing values are NaN there (NULL in SQLite), which would make
+        # every sum NaN and the stamp never match
+        conditions.append(Observation.value != float("nan"))
+    with stage("db_fetch"):
+        return {
+            sid: (count, str(last_date), total)
+            for sid, count, last_date, total in session.execute(
+                select(
+                    Observation.series_id,
+                    func.count(Observation.value),
+                    func.max(Observation.date),
+                    func.sum(Observation.value)
+                ).where(*conditions).group_by(Observation.series_id)
+            )
+        }
+
+def _snapshot_stamps(store, series_ids, start_date):
+    # The DB stamp (non-missing count, last date, sum) from the snapshot arrays
+    stamps = {}
+    for sid in series_ids:
+        if store.meta(sid) is None:
+            continue
+        dates, values = store.arrays(sid, start=start_date)
+        if len(dates) == 0:
+            continue
+        present = values[~np.isnan(values)]
+        stamps[sid] = (len(present), str(dates[-1]), float(present.sum()) if len(present) else None)
+    return stamps
+
+def _snapshot_percentiles(store, series_ids, start_date):
+    # Same ranking as _series_percentiles: share of window values <= the latest
+    scores = {}
+    with stage("percentiles"):
+        for sid in series_ids:
+            _, values = store.arrays(sid, start=start_date)
+            values = values[~np.isnan(values)]
+            if len(values):
+                scores[sid] = float(np.count_nonzero(values <= values[-1])) / len(values) * 100
+    return scores
+
+def outlook_window_start():
+    # The percentile window slides daily, so outlook results depend on today too
+    return date.today() - timedelta(days=365*20)
+
+def get_series_scores(session: Session):
+    # Per-series 20y percentiles, cached by data version + window start. When
+    # the version moves, a grouped (count, max date, sum) stamp per series picks
+    # out the series that actually changed and only those are re-ranked. With
+    # a snapshot store both come from its arrays, without touching the DB.
+    global _outlook
+    start_date = outlook_window_start()
+    store = get_snapshot_store()
+    key = (get_data_version(session), start_date, store is not None)
+
+    cached = _outlook
+    if cached["key"] == key:
+        return cached["scores"]
+
+    with _outlook_lock:
+        cached = _outlook
+        if cached["key"] == key:
+            return cached["scores"]
+
+        series_ids = list(SERIES_TO_LOAD.keys())
+        if store is not None:
+            stamps = _snapshot_stamps(store, series_ids, start_date)
+        else:
+            stamps = _db_stamps(session, series_ids, start_date)
+
+        changed = [sid for sid in stamps if cached["stamps"].get(sid) != stamps[sid]]
+        scores = {sid: score for sid, score in cached["scores"].items() if sid in stamps and sid not in changed}
+        if changed and store is not None:
+            scores.update(_snapshot_percentiles(store, changed, start_date))
+        elif changed:
+            scores.update(_series_percentiles(session, changed, start_date))
+
+        _outlook = {"key": key, "stamps": stamps, "scores": scores}
+        return scores
+
 def get_categories_with_series(session: Session = None):
     categories = {}
     
@@ -65,48 +349,17 @@ def get_categories_with_series(session: Session = None):
 
     if session:
         try:
-            end_date = date.today()
-            start_date = end_date - timedelta(days=365*20)
-            
-            series_ids = list(SERIES_TO_LOAD.keys())
+            series_scores = get_series_scores(session)
             
-            query = session.query(
-                Observation.series_id, 
-                Observation.value, 
-                Observation.date
-            ).filter(
-                Observation.series_id.in_(series_ids),
-                Observation.date >= start_date
-            ).statement
-            
-            df = pd.read_sql(query, session.bind)
-            
-            if not df.empty:
-                df['date'] = pd.to_datetime(df['date'])
-                
-                series_scores = {}
-                for series_id in series_ids:
-                    series_df = df[df['series_id'] == series_id].sort_values('date')
-                    
-                    # Remove any missing values
-                    series_df = series_df.dropna(subset=['value'])
-                    
-                    if not series_df.empty:
-                        current_val = series_df.iloc[-1]['value']
-                        values = series_df['value'].values
-                        rank = (values <= current_val).sum()
-                        percentile = (rank / len(values)) * 100
-                        series_scores[series_id] = percentile
+            for category in categories:
+                cat_series = categories[category]["series"]
+                valid_scores = [series_scores[sid] for sid in cat_series if sid in series_scores]
                 
-                for category in categories:
-                    cat_series = categories[category]["series"]
-                    valid_scores = [series_scores[sid] for sid in cat_series if sid in series_scores]
-                    
-                    if valid_scores:
-                        avg_score = sum(valid_scores) / len(valid_scores)
-                        categories[category]["outlook_score"] = round(avg_score)
+                if valid_scores:
+                    avg_score = sum(valid_scores) / len(valid_scores)
+                    categories[category]["outlook_score"] = round(avg_score)
 
         except Exception as e:
             print(f"Error calculating outlook scores: {e}")
 
-    return categories
\ No newline at end of file
+    return categories
@@ -0,0 +1,31 @@
+import gzip
+
+# Conditional-request and compression helpers shared by the cached endpoints
+
+# Bodies smaller than this aren't worth a gzip round
+GZIP_MIN_BYTES = 1024
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match may list several tags, use weak validators or be "*"
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def compress(body, level=6):
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(body, compresslevel=level, mtime=0)
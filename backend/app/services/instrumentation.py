@@ -0,0 +1,249 @@
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Per-request stage timings and latency histograms, rendered in the
+# Prometheus text format at /metrics. Code marks its hot sections with
+#
+#   with stage("db_fetch"):
+#       ...
+#
+# which feeds crashcompass_stage_seconds{stage=...} and, inside a request,
+# that request's Server-Timing header. The stage dict travels in a context
+# variable, so it follows the request into the threadpool and the inference
+# executor.
+#
+# PROFILE_SLOW_MS=<ms> turns on a sampling profiler: while requests are in
+# flight a background thread samples every thread's Python stack every
+# PROFILE_INTERVAL_MS, and each request slower than the threshold dumps the
+# samples taken during it to PROFILE_DIR as collapsed stacks
+# ("frame;frame;frame count"), ready for flamegraph.pl or speedscope.
+
+METRIC_PREFIX = "crashcompass"
+
+# Seconds; spans sub-millisecond cache hits to multi-second cold SHAP runs
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._series.get(labels)
+            if entry is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                entry = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for le, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                bound = "+Inf" if le == float("inf") else repr(le)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+STAGE_SECONDS = Histogram(f"{METRIC_PREFIX}_stage_seconds", "Time spent in named hot-path stages.", ("stage",))
+REQUEST_SECONDS = Histogram(f"{METRIC_PREFIX}_http_request_seconds", "HTTP request latency.",
+                            ("method", "route", "status"))
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+def _gauge_lines(prefix, value):
+    # Flattens a stats dict ({"hits": 3, "local": {...}}) into gauges
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            lines.extend(_gauge_lines(f"{prefix}_{key}", item))
+        return lines
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return []
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", prefix)
+    return [f"# TYPE {name} gauge", f"{name} {value}"]
+
+def render_metrics(gauges=None):
+    # Prometheus text exposition: stage/request histograms plus any stats
+    # dicts passed in as gauges ({"inference": executor.stats(), ...})
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for name, stats in (gauges or {}).items():
+        lines.extend(_gauge_lines(f"{METRIC_PREFIX}_{name}", stats))
+    if profiler is not None:
+        lines.extend(_gauge_lines(f"{METRIC_PREFIX}_profiler", profiler.stats()))
+    return "\n".join(lines) + "\n"
+
+# Top frames of threads that are parked rather than working; their samples
+# would only bury the request's own stacks
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("core.py", "_connection_worker_thread"),  # aiosqlite, blocked on its queue
+}
+
+def _collapse(frame):
+    if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES:
+        return None
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return ";".join(stack)
+
+class SamplingProfiler:
+    def __init__(self, slow_ms, interval_ms, out_dir, max_files):
+        self.slow_s = slow_ms / 1000
+        self.interval_s = interval_ms / 1000
+        self.out_dir = out_dir
+        self.max_files = max_files
+        # ~60s of samples from a handful of busy threads
+        self._samples = deque(maxlen=int(60 / self.interval_s) * 8)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._thread = None
+        self.samples = 0
+        self.dumps = 0
+
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return time.perf_counter()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval_s)
+            if not self._active:
+                continue
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _collapse(frame)
+                if stack is not None:
+                    self._samples.append((now, f"thread:{names.get(tid, tid)};{stack}"))
+                    self.samples += 1
+
+    def finish(self, started, route):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._active -= 1
+        if elapsed < self.slow_s:
+            return None
+        # Samples from every thread during the request; concurrent requests'
+        # work shows up too, under its own thread and route frames
+        stacks = Counter(stack for t, stack in list(self._samples) if t >= started)
+        if not stacks:
+            return None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r"[^a-zA-Z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(self.out_dir, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps += 1
+        self._prune()
+        print(f"Slow request {route} ({elapsed * 1000:.0f} ms): profile written to {path}")
+        return path
+
+    def _prune(self):
+        files = sorted(f for f in os.listdir(self.out_dir) if f.endswith(".folded"))
+        for name in files[:max(len(files) - self.max_files, 0)]:
+            os.remove(os.path.join(self.out_dir, name))
+
+    def stats(self):
+        return {"slow_ms": self.slow_s * 1000, "interval_ms": self.interval_s * 1000,
+                "samples": self.samples, "dumps": self.dumps}
+
+profiler = SamplingProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_FILES) if PROFILE_SLOW_MS > 0 else None
+
+class InstrumentationMiddleware:
+    # Pure ASGI (no BaseHTTPMiddleware task hop): times every HTTP request by
+    # matched route, collects its stage timings and adds a Server-Timing header
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        profile_started = profiler.begin() if profiler is not None else None
+        status = [500]
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timings:
+                    value = ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in list(timings.items()))
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status[0]))
+            _timings.reset(token)
+            if profile_started is not None:
+                profiler.finish(profile_started, route)
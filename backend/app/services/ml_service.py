@@ -1,121 +1,388 @@
 import os
+import threading
+import time
 import joblib
 import pandas as pd
 import numpy as np
-import shap
+from collections import deque
+from datetime import datetime
 from sqlalchemy.orm import Session
-from app.db.models import Observation
+from app.db.models import DialScore
 from app.db.session import SessionLocal
+from app.services.data_version import get_data_version
+from app.services.executor import shadow_executor
+from app.services.features import get_feature_matrix, get_feature_matrix_as_of
+from app.services import model_registry
+from app.services.forest import CompiledForest, file_digest
+from app.services.instrumentation import stage
 
-MODEL_PATH = "app/ml_models/recession_model.joblib"
+# Serve predictions and SHAP from the exported forest arrays (no sklearn or
+# shap at request time) when an export matching the model is present
+COMPILED_FOREST = os.environ.get("COMPILED_FOREST", "1").lower() in ("1", "true", "yes")
 
-LEVEL_SERIES = [
-    "PAYEMS", "AHETPI", "PCE", "DSPIC96", "CPIAUCSL", "CPILFESL", 
-    "M2REAL", "WM2NS", "INDPRO", "IPMAN", "HOUST", "PERMIT",
-    "WPSFD49207"
-]
+# Load the model with mmap_mode="r" so numpy arrays in the pickle are mapped
+# from the page cache rather than read into each worker's heap
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "0").lower() in ("1", "true", "yes")
 
-_model = None
-_explainer = None
+# How often (seconds) requests check the registry pointers for a new version
+MODEL_POLL_SECONDS = float(os.environ.get("MODEL_POLL_SECONDS", "5"))
+
+# Compute a missing dial score inside the API. Set INLINE_REFRESH=0 when
+# scripts.scheduler precomputes scores, so serving processes never run it.
+INLINE_REFRESH = os.environ.get("INLINE_REFRESH", "1").lower() in ("1", "true", "yes")
+
+# Bounds for one batch scoring request: rows scored, rows explained with SHAP
+# (several times the cost of predicting) and feature overrides per scenario
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "500"))
+BATCH_MAX_EXPLAIN = int(os.environ.get("BATCH_MAX_EXPLAIN", "100"))
+BATCH_MAX_OVERRIDES = int(os.environ.get("BATCH_MAX_OVERRIDES", "32"))
+
+# Cold-start costs in ms, filled in as the pieces load (see warm_up)
+startup_timings = {}
+
+# (version, result) of the last dial score served by this process
+_dial_score = None
+_dial_lock = threading.Lock()
+
+class LoadedModel:
+    # One model version with everything needed to serve it. Never mutated
+    # once prepared: a swap replaces the whole object, so a request that
+    # grabbed it keeps a consistent model/forest/explainer to the end.
+    def __init__(self, ref):
+        self.version = ref.version
+        self.meta = ref.meta
+        self.model_path = ref.model_path
+        self.forest_path = ref.forest_path
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Model not found at {self.model_path}. Run training script first.")
+        self.digest = file_digest(self.model_path)
+        self._model = None
+        self._explainer = None
+        self._lock = threading.Lock()
+        self.forest = self._load_forest()
+
+    def _load_forest(self):
+        if not COMPILED_FOREST or not os.path.exists(self.forest_path):
+            return None
+        started = time.perf_counter()
+        try:
+            forest = CompiledForest.load(self.forest_path)
+        except Exception as e:
+            print(f"Could not load compiled forest: {e}")
+            return None
+        if forest.source_digest != self.digest:
+            print(f"{self.forest_path} was not exported from the current model; run scripts.export_forest")
+            return None
+        startup_timings["forest_load_ms"] = (time.perf_counter() - started) * 1000
+        return forest
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = joblib.load(self.model_path, mmap_mode="r" if MODEL_MMAP else None)
+                    startup_timings["model_load_ms"] = (time.perf_counter() - started) * 1000
+        return self._model
+
+    def get_explainer(self):
+        if self._explainer is None:
+            model = self.get_model()
+            with self._lock:
+                if self._explainer is None:
+                    # shap is slow to import, so only pay for it when an explainer is needed
+                    started = time.perf_counter()
+                    import shap
+                    startup_timings["shap_import_ms"] = (time.perf_counter() - started) * 1000
+
+                    started = time.perf_counter()
+                    # Use TreeExplainer for Random Forest
+                    self._explainer = shap.TreeExplainer(model)
+                    startup_timings["explainer_build_ms"] = (time.perf_counter() - started) * 1000
+        return self._explainer
+
+    def prepare(self):
+        # With a compiled forest neither sklearn nor shap is needed to serve
+        if self.forest is None:
+            self.get_model()
+            self.get_explainer()
+        return self
+
+    @property
+    def feature_names(self):
+        if self.forest is not None:
+            return self.forest.feature_names
+        return list(self.get_model().feature_names_in_)
+
+    def predict_proba(self, X):
+        # Class-1 (recession) probability per row
+        if self.forest is not None:
+            return self.forest.predict_proba(X)
+        return self.get_model().predict_proba(X)[:, 1]
+
+    def shap_values(self, X):
+        # Class-1 SHAP values, shape (rows, features)
+        if self.forest is not None:
+            return self.forest.shap_values(X)
+        values = self.get_explainer().shap_values(X)
+        # shap_values for Classifier might be a list or a 3D array
+        if isinstance(values, list):
+            return values[1]
+        values = np.asarray(values)
+        return values[:, :, 1] if values.ndim == 3 else values
+
+class ShadowStats:
+    # Live vs candidate latency over the last WINDOW scorings and output
+    # drift over the last WINDOW scored rows
+    WINDOW = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, candidate):
+        with self._lock:
+            self.candidate = candidate
+            self.count = 0
+            self.rows = 0
+            self._samples = deque(maxlen=self.WINDOW)
+            self._diffs = deque(maxlen=self.WINDOW)
+
+    def record(self, candidate, live_ms, shadow_ms, diffs):
+        with self._lock:
+            if candidate != self.candidate:
+                return
+            self.count += 1
+            self.rows += len(diffs)
+            self._samples.append((live_ms, shadow_ms))
+            self._diffs.extend(diffs)
+
+    def stats(self):
+        with self._lock:
+            out = {"candidate": self.candidate, "scored": self.count, "rows": self.rows}
+            if self._samples:
+                live, shadow = (np.array(c) for c in zip(*self._samples))
+                diff = np.array(self._diffs)
+                out.update({
+                    "live_ms_p50": float(np.percentile(live, 50)),
+                    "live_ms_p95": float(np.percentile(live, 95)),
+                    "shadow_ms_p50": float(np.percentile(shadow, 50)),
+                    "shadow_ms_p95": float(np.percentile(shadow, 95)),
+                    "mean_abs_diff": float(diff.mean()),
+                    "max_abs_diff": float(diff.max()),
+                })
+            return out
+
+# Live model, optional shadow candidate, and the registry stamp they match.
+# Readers take a reference without locking; a swap is one assignment.
+_active = None
+_candidate = None
+_registry_key = None
+_registry_checked = 0.0
+_swap_lock = threading.Lock()
+shadow_stats = ShadowStats()
+
+def _reload():
+    # Loads whatever the registry pointers name now. Called with _swap_lock
+    # held; the old models keep serving until the new ones are prepared.
+    global _active, _candidate, _registry_key
+    key = model_registry.registry_stamp()
+    try:
+        ref = model_registry.resolve(model_registry.CURRENT)
+        if ref is None:
+            raise FileNotFoundError(f"Model not found at {model_registry.MODEL_PATH}. Run training script first.")
+        if _active is None or _active.version != ref.version:
+            loaded = LoadedModel(ref).prepare()
+            if _active is not None:
+                print(f"Model swapped: {_active.version} -> {loaded.version}")
+            _active = loaded
+
+        ref = model_registry.resolve(model_registry.CANDIDATE)
+        if ref is None or ref.version == _active.version:
+            _candidate = None
+        elif _candidate is None or _candidate.version != ref.version:
+            _candidate = LoadedModel(ref).prepare()
+            print(f"Shadow scoring candidate {ref.version}")
+        if shadow_stats.candidate != (_candidate.version if _candidate else None):
+            shadow_stats.reset(_candidate.version if _candidate else None)
+    finally:
+        # A broken version is not retried until the pointers change again
+        _registry_key = key
+
+def _reload_in_background():
+    try:
+        _reload()
+    except Exception as e:
+        print(f"Model reload failed, still serving {_active.version}: {e}")
+    finally:
+        _swap_lock.release()
+
+def active_model():
+    # The LoadedModel to serve. The first call loads it; afterwards the
+    # registry is polled every MODEL_POLL_SECONDS and a new version is loaded
+    # on a background thread, so no request waits on (or fails during) a swap.
+    global _registry_checked
+    if _active is None:
+        with _swap_lock:
+            if _active is None:
+                _reload()
+        return _active
+
+    now = time.monotonic()
+    if now - _registry_checked >= MODEL_POLL_SECONDS:
+        _registry_checked = now
+        if model_registry.registry_stamp() != _registry_key and _swap_lock.acquire(blocking=False):
+            threading.Thread(target=_reload_in_background, name="model-reload", daemon=True).start()
+    return _active
+
+def model_loaded():
+    # Whether active_model() can answer without loading
+    return _active is not None
+
+def candidate_model():
+    active_model()
+    return _candidate
+
+def model_info():
+    active = active_model()
+    return {
+        "version": active.version,
+        "compiled": active.forest is not None,
+        "meta": active.meta,
+        "shadow": shadow_stats.stats(),
+    }
 
 def get_model():
-    global _model
-    if _model is None:
-        if os.path.exists(MODEL_PATH):
-            _model = joblib.load(MODEL_PATH)
-        else:
-            raise FileNotFoundError(f"Model not found at {MODEL_PATH}. Run training script first.")
-    return _model
+    return active_model().get_model()
+
+def get_forest():
+    return active_model().forest
 
 def get_explainer():
-    global _explainer
-    if _explainer is None:
-        model = get_model()
-        # Use TreeExplainer for Random Forest
-        _explainer = shap.TreeExplainer(model)
-    return _explainer
-
-def predict_recession_prob(session: Session = None):
+    return active_model().get_explainer()
+
+def warm_up():
+    # Called from the API lifespan so the first /dial_score after a deploy
+    # doesn't pay for model load, shap import and explainer construction
+    started = time.perf_counter()
+    try:
+        active_model()
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+
+    session = SessionLocal()
+    try:
+        get_precomputed_dial_score(session)
+    except Exception as e:
+        print(f"Dial score warm-up failed: {e}")
+    finally:
+        session.close()
+
+    startup_timings["warm_up_ms"] = (time.perf_counter() - started) * 1000
+    return startup_timings
+
+def _batch_features(matrix, columns, rows, scenarios=(), first=0):
+    # Model input in `columns` order for the matrix `rows`, with scenario k's
+    # overrides applied to row first + k (names outside `columns` are skipped)
+    X = matrix.select(columns, rows=np.asarray(rows))
+    values = X.to_numpy(copy=True)
+    positions = {c: j for j, c in enumerate(columns)}
+    for k, scenario in enumerate(scenarios, start=first):
+        for name, value in (scenario.get("overrides") or {}).items():
+            if name in positions:
+                values[k, positions[name]] = value
+    values = np.nan_to_num(values, nan=0.0)
+    return pd.DataFrame(values, index=X.index, columns=columns)
+
+def _shadow_job(candidate, live, matrix, rows, scenarios, first, live_probs, live_ms):
+    # Scores the served rows with the candidate; its output is only recorded.
+    # Without the live outputs (a precomputed dial score) the live model is
+    # re-run here too, so both latencies are measured on the same input.
+    try:
+        if live_probs is None:
+            X = _batch_features(matrix, live.feature_names, rows, scenarios, first)
+            started = time.perf_counter()
+            live_probs = live.predict_proba(X)
+            live_ms = (time.perf_counter() - started) * 1000
+        X = _batch_features(matrix, candidate.feature_names, rows, scenarios, first)
+        started = time.perf_counter()
+        with stage("shadow_predict"):
+            probs = candidate.predict_proba(X)
+        shadow_stats.record(candidate.version, live_ms, (time.perf_counter() - started) * 1000,
+                            np.abs(np.asarray(probs, dtype=np.float64) - np.asarray(live_probs, dtype=np.float64)))
+    except Exception as e:
+        print(f"Shadow scoring {candidate.version} failed: {e}")
+
+def _shadow(live, matrix, rows, scenarios=(), first=0, live_probs=None, live_ms=None):
+    # Queues the candidate on the rows just served, off the response path
+    candidate = _candidate
+    if candidate is None or candidate is live or matrix is None:
+        return
+    shadow_executor.submit(_shadow_job, candidate, live, matrix, rows, list(scenarios), first, live_probs, live_ms)
+
+def _shadow_dial_job(candidate, live, as_of):
+    db = SessionLocal()
+    try:
+        matrix = get_feature_matrix_as_of(db, as_of) if as_of is not None else get_feature_matrix(db)
+    finally:
+        db.close()
+    if matrix is not None:
+        _shadow_job(candidate, live, matrix, [len(matrix) - 1], [], 0, None, None)
+
+def shadow_dial_score(as_of=None):
+    # Called for every served /dial_score: scores its month with the candidate
+    # in the background. The feature matrix is loaded in the job (it is
+    # normally cached), so the request pays only for the submit.
+    candidate, live = _candidate, _active
+    if candidate is None or candidate is live:
+        return
+    shadow_executor.submit(_shadow_dial_job, candidate, live, as_of)
+
+def _top_contributors(columns, values, shap_row, top=3):
+    contributions = [
+        {"name": col, "value": float(values[i]), "shap": float(shap_row[i])}
+        for i, col in enumerate(columns)
+    ]
+    # Sort by absolute SHAP value to get biggest drivers (positive or negative)
+    contributions.sort(key=lambda x: abs(x["shap"]), reverse=True)
+    return contributions[:top]
+
+def predict_recession_prob(session: Session = None, model: LoadedModel = None, as_of=None, matrix=None):
+    # as_of (a date) scores the month containing it on the data as it was
+    # published by then, from observation_vintages. `matrix` scores a given
+    # FeatureMatrix instead (e.g. one built for a version not yet published).
     close_session = False
     if session is None:
         session = SessionLocal()
         close_session = True
         
     try:
-        model = get_model()
-        
-        from datetime import date, timedelta
-        start_date = date.today() - timedelta(days=450)
+        if model is None:
+            model = active_model()
         
-        query = session.query(Observation).filter(Observation.date >= start_date).statement
-        df = pd.read_sql(query, session.bind)
+        if as_of is not None:
+            matrix = get_feature_matrix_as_of(session, as_of)
+        elif matrix is None:
+            matrix = get_feature_matrix(session)
         
-        if df.empty:
+        if matrix is None:
             return None
-            
-        df_pivot = df.pivot(index="date", columns="series_id", values="value")
-        df_pivot.index = pd.to_datetime(df_pivot.index)
-        df_pivot.sort_index(inplace=True)
-        
-        df_monthly = df_pivot.resample('ME').last()
-        df_monthly = df_monthly.ffill()
-        
-        for col in df_monthly.columns:
-            if col in LEVEL_SERIES:
-                df_monthly[f"{col}_YoY"] = df_monthly[col].pct_change(12)
-                df_monthly.drop(columns=[col], inplace=True)
         
-        latest_data = df_monthly.iloc[[-1]]
-        
-        expected_features = model.feature_names_in_
-        
-        X = latest_data.reindex(columns=expected_features)
+        X = matrix.latest(model.feature_names)
         
         if X.isnull().values.any():
             X = X.fillna(0)
             
-        prob = model.predict_proba(X)[0][1]
+        with stage("predict"):
+            prob = model.predict_proba(X)[0]
 
         # Calculate SHAP contributions
         top_contributors = []
         try:
-            explainer = get_explainer()
-            shap_values = explainer.shap_values(X)
-            
-            # shap_values for Classifier might be a list or a 3D array
-            # We want class 1 (Recession)
-            if isinstance(shap_values, list):
-                # Case: List of arrays [ (N, F), (N, F) ]
-                recession_shap = shap_values[1][0]
-            elif hasattr(shap_values, 'shape') and len(shap_values.shape) == 3:
-                # Case: Array (N, F, C) -> (1, F, 2)
-                # We want sample 0, all features, class 1
-                recession_shap = shap_values[0, :, 1]
-            else:
-                # Case: Array (N, F)
-                recession_shap = shap_values[0]
-
-            contributions = []
-            for i, col in enumerate(X.columns):
-                val = X.iloc[0, i]
-                shap_val = recession_shap[i]
-
-                # Ensure scalar
-                if isinstance(val, (pd.Series, np.ndarray)):
-                    val = val.item()
-                if isinstance(shap_val, (pd.Series, np.ndarray)):
-                    shap_val = shap_val.item()
-
-                contributions.append({
-                    "name": col,
-                    "value": float(val),
-                    "shap": float(shap_val)
-                })
-            
-            # Sort by absolute SHAP value to get biggest drivers (positive or negative)
-            contributions.sort(key=lambda x: abs(x["shap"]), reverse=True)
-            top_contributors = contributions[:3]
-
+            # Class 1 (Recession), one row per sample
+            with stage("shap"):
+                recession_shap = model.shap_values(X)[0]
+            top_contributors = _top_contributors(X.columns, X.to_numpy()[0], recession_shap)
         except Exception as e:
             print(f"SHAP calculation failed: {e}")
             # Fallback: just return empty
@@ -129,3 +396,152 @@ def predict_recession_prob(session: Session = None):
     finally:
         if close_session:
             session.close()
+
+def _month_row(matrix, as_of):
+    # Row of the month containing `as_of`; None means the latest month
+    if as_of is None:
+        return len(matrix) - 1
+    i = int(matrix.index.searchsorted(pd.Timestamp(as_of)))
+    if i >= len(matrix) or (i == 0 and pd.Timestamp(as_of) < matrix.index[0].replace(day=1)):
+        raise ValueError(f"No data for {as_of}; scorable months are "
+                         f"{matrix.index[0]:%Y-%m} to {matrix.index[-1]:%Y-%m}")
+    return i
+
+def score_batch(session: Session, dates=(), scenarios=(), explain=False, model: LoadedModel = None):
+    # Scores many as-of dates and what-if scenarios with one predict_proba
+    # (and one SHAP) call. `dates` are scored on their month's features as
+    # stored; each scenario is {"as_of": date or None, "overrides": {feature:
+    # value}} on top of its month. Results come back in request order, dates
+    # first. Raises ValueError for requests outside the limits or the data.
+    dates = list(dates)
+    scenarios = list(scenarios)
+    n = len(dates) + len(scenarios)
+    if n == 0:
+        raise ValueError("Nothing to score: pass dates and/or scenarios")
+    if n > BATCH_MAX_ROWS:
+        raise ValueError(f"{n} rows requested; the limit is {BATCH_MAX_ROWS}")
+    if explain and n > BATCH_MAX_EXPLAIN:
+        raise ValueError(f"explain is limited to {BATCH_MAX_EXPLAIN} rows; {n} requested")
+
+    if model is None:
+        model = active_model()
+    matrix = get_feature_matrix(session)
+    if matrix is None:
+        return None
+
+    columns = model.feature_names
+    positions = {c: j for j, c in enumerate(columns)}
+    rows = [_month_row(matrix, d) for d in dates]
+    for scenario in scenarios:
+        overrides = scenario.get("overrides") or {}
+        if len(overrides) > BATCH_MAX_OVERRIDES:
+            raise ValueError(f"{len(overrides)} overrides in one scenario; the limit is {BATCH_MAX_OVERRIDES}")
+        unknown = sorted(set(overrides) - set(positions))
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}; the model uses {columns}")
+        rows.append(_month_row(matrix, scenario.get("as_of")))
+
+    X = _batch_features(matrix, columns, rows, scenarios, len(dates))
+    values = X.to_numpy()
+
+    started = time.perf_counter()
+    with stage("predict"):
+        probs = model.predict_proba(X)
+    _shadow(model, matrix, rows, scenarios, len(dates), probs, (time.perf_counter() - started) * 1000)
+    shap = None
+    if explain:
+        with stage("shap"):
+            shap = model.shap_values(X)
+
+    months = list(X.index.strftime("%Y-%m-%d"))
+    scores = (np.asarray(probs) * 100).tolist()
+    results = []
+    for k in range(n):
+        result = {"month": months[k], "score": scores[k]}
+        if k < len(dates):
+            result["as_of"] = str(dates[k])
+        else:
+            scenario = scenarios[k - len(dates)]
+            result["as_of"] = None if scenario.get("as_of") is None else str(scenario["as_of"])
+            result["overrides"] = scenario.get("overrides") or {}
+        if shap is not None:
+            result["contributors"] = _top_contributors(columns, values[k], shap[k])
+        results.append(result)
+    return {"model": model.version, "data_version": matrix.version, "results": results}
+
+def get_score_version(session: Session):
+    # Scores are only valid for the data they were computed on and the model
+    # that produced them, so both go into the key.
+    return f"{get_data_version(session)}:{active_model().version}"
+
+def _as_result(row: DialScore):
+    return {"score": row.score, "contributors": row.contributors or []}
+
+def refresh_dial_score(session: Session, version=None, matrix=None, commit=True):
+    # Runs the full predict + SHAP chain and stores it for the current version
+    # (or for `version`, scoring `matrix`). Older snapshots are dropped, but
+    # the one being served stays until `version` is published. commit=False
+    # leaves the row to the caller's transaction.
+    if version is None:
+        version = get_score_version(session)
+
+    result = predict_recession_prob(session=session, matrix=matrix)
+    if result is None:
+        return None
+
+    served = get_score_version(session)
+    session.query(DialScore).filter(DialScore.version.notin_({version, served})).delete(synchronize_session=False)
+    session.merge(DialScore(
+        version=version,
+        score=result["score"],
+        contributors=result["contributors"],
+        computed_at=datetime.utcnow()
+    ))
+    if commit:
+        session.commit()
+    return result
+
+def cached_dial_score(version):
+    # In-process snapshot only; never touches the DB or the model
+    cached = _dial_score
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    return None
+
+def get_precomputed_dial_score(session: Session, version=None):
+    global _dial_score
+    if version is None:
+        version = get_score_version(session)
+
+    result = cached_dial_score(version)
+    if result is not None:
+        return result
+
+    # Single-flight: the first cold request computes, concurrent ones wait on
+    # the lock and then pick up the stored snapshot instead of running SHAP again.
+    with _dial_lock:
+        cached = _dial_score
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        row = session.get(DialScore, version)
+        if row is not None:
+            result = _as_result(row)
+        elif not INLINE_REFRESH:
+            # The scheduler hasn't scored this version yet (e.g. a model was
+            # just promoted): serve the newest stored score for the published
+            # data, never one precomputed for a version still being published
+            data_version = get_data_version(session)
+            row = (
+                session.query(DialScore)
+                .filter(DialScore.version.startswith(f"{data_version}:", autoescape=True))
+                .order_by(DialScore.computed_at.desc())
+                .first()
+            )
+            return None if row is None else _as_result(row)
+        else:
+            result = refresh_dial_score(session, version)
+
+        if result is not None:
+            _dial_score = (version, result)
+        return result
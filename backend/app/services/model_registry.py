@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+import joblib
+from app.services.forest import export_forest, file_digest
+
+# Versioned model artifacts. Each version is an immutable directory
+#
+#   <REGISTRY_DIR>/<version>/model.joblib        the sklearn forest
+#   <REGISTRY_DIR>/<version>/model.forest.npz    its compiled export
+#   <REGISTRY_DIR>/<version>/meta.json           features, window, metrics
+#
+# and small pointer files name the version to serve (CURRENT), the one it
+# replaced (PREVIOUS) and an optional shadow candidate (CANDIDATE). Versions
+# are written to a temp dir and renamed into place, and pointers are replaced
+# atomically, so a reader never sees a half-written model. Without a CURRENT
+# pointer the API serves the legacy single files below.
+
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "app/ml_models/registry")
+
+MODEL_PATH = "app/ml_models/recession_model.joblib"
+FOREST_PATH = "app/ml_models/recession_model.forest.npz"
+
+MODEL_FILE = "model.joblib"
+FOREST_FILE = "model.forest.npz"
+META_FILE = "meta.json"
+
+CURRENT = "CURRENT"
+PREVIOUS = "PREVIOUS"
+CANDIDATE = "CANDIDATE"
+
+class ModelRef:
+    # Where one model version lives on disk
+    def __init__(self, version, model_path, forest_path, meta=None):
+        self.version = version
+        self.model_path = model_path
+        self.forest_path = forest_path
+        self.meta = meta or {}
+
+def version_dir(version, root=REGISTRY_DIR):
+    return os.path.join(root, version)
+
+def read_pointer(name, root=REGISTRY_DIR):
+    try:
+        with open(os.path.join(root, name)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def write_pointer(name, version, root=REGISTRY_DIR):
+    target = os.path.join(root, name)
+    if version is None:
+        if os.path.exists(target):
+            os.remove(target)
+        return
+    os.makedirs(root, exist_ok=True)
+    tmp = f"{target}.tmp"
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, target)
+
+def read_meta(version, root=REGISTRY_DIR):
+    path = os.path.join(version_dir(version, root), META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def list_versions(root=REGISTRY_DIR):
+    if not os.path.isdir(root):
+        return []
+    metas = [read_meta(name, root) for name in os.listdir(root) if not name.startswith(".")]
+    return sorted((m for m in metas if m is not None), key=lambda m: m["created_at"])
+
+def registry_stamp(root=REGISTRY_DIR):
+    # Changes whenever a pointer (or the legacy model file) is rewritten;
+    # cheap enough for the API to poll
+    stamp = []
+    for path in (os.path.join(root, CURRENT), os.path.join(root, CANDIDATE), MODEL_PATH):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def get_ref(version, root=REGISTRY_DIR):
+    meta = read_meta(version, root)
+    if meta is None:
+        raise ValueError(f"Unknown model version '{version}'")
+    path = version_dir(version, root)
+    return ModelRef(version, os.path.join(path, MODEL_FILE), os.path.join(path, FOREST_FILE), meta)
+
+def resolve(name=CURRENT, root=REGISTRY_DIR):
+    # ModelRef for a pointer. CURRENT falls back to the legacy files when the
+    # registry has no versions yet; other pointers are None when unset.
+    version = read_pointer(name, root)
+    if version is not None:
+        return get_ref(version, root)
+    if name != CURRENT or not os.path.exists(MODEL_PATH):
+        return None
+    return ModelRef(f"legacy-{file_digest(MODEL_PATH)[:12]}", MODEL_PATH, FOREST_PATH)
+
+def register_model(model, meta=None, root=REGISTRY_DIR, activate=True):
+    # Stores a fitted forest (and its compiled export) as a new version and,
+    # with activate=True, points CURRENT at it. Returns the version.
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+    try:
+        model_path = os.path.join(staging, MODEL_FILE)
+        joblib.dump(model, model_path)
+        digest = file_digest(model_path)
+        export_forest(model, os.path.join(staging, FOREST_FILE), source_digest=digest)
+
+        created = datetime.utcnow()
+        version = f"{created:%Y%m%dT%H%M%S}-{digest[:8]}"
+        params = model.get_params()
+        record = {
+            "version": version,
+            "created_at": created.isoformat(timespec="seconds"),
+            "model_digest": digest,
+            "features": [str(c) for c in model.feature_names_in_],
+            "params": {k: params[k] for k in ("n_estimators", "max_depth", "min_samples_leaf", "max_features")},
+        }
+        record.update(meta or {})
+        with open(os.path.join(staging, META_FILE), "w") as f:
+            json.dump(record, f, indent=1, default=str)
+
+        os.rename(staging, version_dir(version, root))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        promote(version, root)
+    return version
+
+def promote(version, root=REGISTRY_DIR):
+    if read_meta(version, root) is None:
+        raise ValueError(f"Unknown model version '{version}'")
+    current = read_pointer(CURRENT, root)
+    if current == version:
+        return
+    if current is not None:
+        write_pointer(PREVIOUS, current, root)
+    write_pointer(CURRENT, version, root)
+    if read_pointer(CANDIDATE, root) == version:
+        write_pointer(CANDIDATE, None, root)
+
+def rollback(root=REGISTRY_DIR):
+    previous = read_pointer(PREVIOUS, root)
+    if previous is None:
+        raise ValueError("No previous model version to roll back to")
+    promote(previous, root)
+    return previous
+
+def set_candidate(version, root=REGISTRY_DIR):
+    # Shadow-score `version` next to the live model (None stops shadowing)
+    if version is not None and read_meta(version, root) is None:
+        raise ValueError(f"Unknown model version '{version}'")
+    write_pointer(CANDIDATE, version, root)
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cross-route cache of encoded response bodies. Keys carry the route, its
+# parameters and the data version, so ingest publishing a new version makes
+# every old entry unreachable; TTL and size bounds only reclaim memory.
+#
+#   RESPONSE_CACHE=memory (default) in-process LRU only
+#   RESPONSE_CACHE=redis            in-process LRU in front of a shared Redis
+#   RESPONSE_CACHE=off              no body caching (ETags still work)
+
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "memory").lower()
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Freshness handed to browsers and CDNs; after that they revalidate with
+# If-None-Match, which costs a data-version read and no body
+CACHE_MAX_AGE = int(os.environ.get("CACHE_MAX_AGE", "60"))
+CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}"
+
+class CachedResponse:
+    __slots__ = ("body", "media_type")
+
+    def __init__(self, body, media_type="application/json"):
+        self.body = body
+        self.media_type = media_type
+
+class MemoryCache:
+    # LRU bounded by entry count and total body bytes, with a per-entry TTL
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry.body)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, entry = self._entries.pop(key)
+        self.bytes -= len(entry.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+class RedisCache:
+    # Shared tier for multi-worker/multi-host deployments. Errors are counted
+    # and treated as misses so a Redis outage degrades to recomputing.
+    def __init__(self, url, ttl, prefix="cc:resp:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._errors = (redis.RedisError, OSError)
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self.prefix + key)
+        except self._errors:
+            self.errors += 1
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        media_type, _, body = raw.partition(b"\n")
+        return CachedResponse(body, media_type.decode())
+
+    def set(self, key, entry):
+        try:
+            self._client.set(self.prefix + key, entry.media_type.encode() + b"\n" + entry.body, ex=self.ttl)
+        except self._errors:
+            self.errors += 1
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(match=self.prefix + "*"):
+                self._client.delete(key)
+        except self._errors:
+            self.errors += 1
+
+    def stats(self):
+        return {"backend": "redis", "url": self.url, "ttl_s": self.ttl,
+                "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+class ResponseCache:
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    # For async handlers: the local tier is answered inline, the blocking
+    # Redis round trip runs on a worker thread instead of the event loop
+    async def aget(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = await asyncio.to_thread(self.shared.get, key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    async def aset(self, key, entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, key, entry)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        out = {"local": self.local.stats()}
+        if self.shared is not None:
+            out["shared"] = self.shared.stats()
+        return out
+
+def build_response_cache(mode=RESPONSE_CACHE):
+    max_entries = 0 if mode == "off" else RESPONSE_CACHE_MAX_ENTRIES
+    local = MemoryCache(max_entries, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+    shared = None
+    if mode == "redis":
+        try:
+            shared = RedisCache(REDIS_URL, RESPONSE_CACHE_TTL)
+        except ImportError:
+            print("RESPONSE_CACHE=redis needs the redis package; using the in-process cache only")
+    return ResponseCache(local, shared)
+
+response_cache = build_response_cache()
+
+def cache_key(route, version, **params):
+    # Parameter order doesn't matter; None and missing are the same
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+    return f"{route}|{version}|{query}"
+
+def make_etag(key):
+    # Strong validator: builders are deterministic, so one key is one body
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
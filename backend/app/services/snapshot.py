@@ -0,0 +1,288 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.models import Series, Observation
+from app.services.data_version import get_db_data_version
+
+# Columnar snapshot of the observations table, one file per series under a
+# hive-style layout (<dir>/v000007/series_id=PAYEMS/part.arrow) so each
+# version directory is also a partitioned dataset for pyarrow.dataset /
+# DuckDB / Spark. The manifest names the current version directory. The default Arrow
+# IPC files are uncompressed and memory-mapped on read: values are zero-copy
+# views of the page cache. Parquet is available for exports meant for other
+# tools; it is smaller but has to be decoded on every load.
+#
+# DATA_BACKEND=snapshot serves series reads, feature loads and the data
+# version from the snapshot instead of the database. pyarrow is optional and
+# only imported when a snapshot is written or read.
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "data/snapshot")
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "db").lower()
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+FILE_NAMES = {"arrow": "part.arrow", "parquet": "part.parquet"}
+VERSION_PREFIX = "v"
+
+_store = None
+_store_lock = threading.Lock()
+_warned = set()
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(message)
+
+def _series_file(path, series_id, file_format):
+    return os.path.join(path, f"series_id={series_id}", FILE_NAMES[file_format])
+
+def _series_stamps(session: Session):
+    # (rows, last date, sum) per series; a changed stamp means a changed file
+    return {
+        sid: [count, str(last_date), total]
+        for sid, count, last_date, total in session.execute(
+            select(
+                Observation.series_id,
+                func.count(Observation.id),
+                func.max(Observation.date),
+                func.sum(Observation.value)
+            ).group_by(Observation.series_id)
+        )
+    }
+
+def _write_series(session: Session, path, series_id, file_format):
+    import pyarrow as pa
+
+    rows = session.execute(
+        select(Observation.date, Observation.value)
+        .where(Observation.series_id == series_id)
+        .order_by(Observation.date.asc())
+    ).all()
+    dates = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    # Missing values are stored as NaN rather than null so reads stay zero-copy
+    values = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=np.float64)
+    table = pa.table({"date": pa.array(dates, type=pa.date32()), "value": pa.array(values)})
+
+    target = _series_file(path, series_id, file_format)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.tmp"
+    if file_format == "arrow":
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp)
+    os.replace(tmp, target)
+    return len(rows)
+
+def _version_root(path, manifest):
+    # Snapshots from before version directories kept the series at the top level
+    return os.path.join(path, manifest.get("dir", "")) if manifest else path
+
+def _link_series(old_root, root, series_id, file_format):
+    # Unchanged series are hard-linked into the new version, not rewritten
+    source = _series_file(old_root, series_id, file_format)
+    target = _series_file(root, series_id, file_format)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def _collect_garbage(path, keep):
+    # Drops version directories neither the new nor the previous manifest
+    # uses. The previous one stays, so a store that is still serving it can
+    # finish loading its series lazily.
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name in keep or not os.path.isdir(full):
+            continue
+        if name.startswith(VERSION_PREFIX) or (name.startswith("series_id=") and "" not in keep):
+            shutil.rmtree(full, ignore_errors=True)
+
+def read_manifest(path=SNAPSHOT_DIR):
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def export_snapshot(session: Session, path=SNAPSHOT_DIR, file_format="arrow", full=False):
+    # Syncs the snapshot with the database into a new version directory. Only
+    # series whose stamp changed since the last export are rewritten, the rest
+    # are linked from the previous version. Files are never modified in place
+    # and the manifest is replaced last, so a reader sees either the old
+    # version or the new one. Returns (manifest, changed).
+    if file_format not in FILE_NAMES:
+        raise ValueError(f"Unsupported snapshot format '{file_format}'")
+    started = time.perf_counter()
+    version = get_db_data_version(session)
+    stamps = _series_stamps(session)
+
+    previous = read_manifest(path)
+    generation = (previous or {}).get("generation", 0) + 1
+    name = f"{VERSION_PREFIX}{generation:06d}"
+    root = os.path.join(path, name)
+    # Left over from an export that died before its manifest was written
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+
+    old = None if full else previous
+    if old is not None and (old.get("format") != SNAPSHOT_FORMAT or old.get("file_format") != file_format):
+        old = None
+    old_series = old["series"] if old else {}
+    old_root = _version_root(path, old)
+
+    changed = [
+        sid for sid, stamp in stamps.items()
+        if old_series.get(sid, {}).get("stamp") != stamp
+        or not os.path.exists(_series_file(old_root, sid, file_format))
+    ]
+
+    for sid in stamps:
+        if sid in changed:
+            _write_series(session, root, sid, file_format)
+        else:
+            _link_series(old_root, root, sid, file_format)
+
+    series = {}
+    for row in session.execute(select(Series.series_id, Series.name, Series.frequency, Series.units, Series.category)):
+        if row.series_id in stamps:
+            series[row.series_id] = {
+                "name": row.name,
+                "frequency": row.frequency,
+                "units": row.units,
+                "category": row.category,
+                "rows": stamps[row.series_id][0],
+                "stamp": stamps[row.series_id],
+            }
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "file_format": file_format,
+        "generation": generation,
+        "dir": name,
+        "data_version": version,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "series": series,
+    }
+    tmp = os.path.join(path, f"{MANIFEST}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+    _collect_garbage(path, {name, previous.get("dir", "") if previous else name})
+
+    print(f"Snapshot {version}: {len(changed)} of {len(stamps)} series rewritten in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms ({path})")
+    return manifest, changed
+
+class SnapshotStore:
+    def __init__(self, path, manifest, key):
+        self.path = path
+        self.root = _version_root(path, manifest)
+        self.key = key
+        self.version = manifest["data_version"]
+        self.file_format = manifest["file_format"]
+        self.series = manifest["series"]
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def meta(self, series_id):
+        return self.series.get(series_id)
+
+    def arrays(self, series_id, start=None, end=None):
+        # (datetime64[D] dates, float64 values) for [start, end]; the values
+        # of an Arrow IPC snapshot are a view of the mapped file
+        cached = self._arrays.get(series_id)
+        if cached is None:
+            with self._lock:
+                cached = self._arrays.get(series_id)
+                if cached is None:
+                    cached = self._load(series_id)
+                    self._arrays[series_id] = cached
+        dates, values = cached
+        lo = np.searchsorted(dates, np.datetime64(start, "D")) if start else 0
+        hi = np.searchsorted(dates, np.datetime64(end, "D"), side="right") if end else len(dates)
+        return dates[lo:hi], values[lo:hi]
+
+    def _load(self, series_id):
+        import pyarrow as pa
+
+        target = _series_file(self.root, series_id, self.file_format)
+        if self.file_format == "arrow":
+            table = pa.ipc.open_file(pa.memory_map(target, "r")).read_all()
+        else:
+            import pyarrow.parquet as pq
+            table = pq.read_table(target, memory_map=True)
+        # Writers emit a single chunk, so this is a no-op for our own files
+        table = table.combine_chunks()
+        values = table.column("value").chunk(0).to_numpy(zero_copy_only=True) if table.num_rows else np.empty(0)
+        dates = table.column("date").to_numpy().astype("datetime64[D]")
+        return dates, values
+
+    def monthly_levels(self, start=None):
+        # Same frame load_monthly_levels builds from SQL (pivot, then
+        # resample("ME").last()), reduced per series straight from the arrays:
+        # the last non-missing value in each month, over a continuous month range
+        frame = {}
+        first = last_date = None
+        for sid in sorted(self.series):
+            dates, values = self.arrays(sid, start=start)
+            if len(dates) == 0:
+                continue
+            # Rows with missing values still widen the month range, as in the pivot
+            first = dates[0] if first is None else min(first, dates[0])
+            last_date = dates[-1] if last_date is None else max(last_date, dates[-1])
+
+            keep = ~np.isnan(values)
+            months = dates[keep].astype("datetime64[M]")
+            ends = np.flatnonzero(np.append(months[1:] != months[:-1], True)) if len(months) else []
+            month_ends = (months[ends] + 1).astype("datetime64[D]") - 1
+            frame[sid] = pd.Series(values[keep][ends], index=pd.DatetimeIndex(month_ends), dtype=np.float64)
+        if not frame:
+            return None
+
+        df = pd.DataFrame(frame)
+        df = df.reindex(pd.date_range(pd.Timestamp(first), pd.Timestamp(last_date) + pd.offsets.MonthEnd(0),
+                                      freq="ME", name="date"))
+        df.columns.name = "series_id"
+        return df
+
+def get_snapshot_store(path=SNAPSHOT_DIR):
+    # The active store when DATA_BACKEND=snapshot and a snapshot exists, else
+    # None (callers then read the database). Reloaded when the manifest changes.
+    global _store
+    if DATA_BACKEND != "snapshot":
+        return None
+    manifest_path = os.path.join(path, MANIFEST)
+    try:
+        st = os.stat(manifest_path)
+    except FileNotFoundError:
+        _warn_once(f"DATA_BACKEND=snapshot but {manifest_path} is missing; reading from the database")
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+
+    store = _store
+    if store is not None and store.key == key:
+        return store
+    with _store_lock:
+        if _store is not None and _store.key == key:
+            return _store
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            _warn_once("DATA_BACKEND=snapshot needs pyarrow; reading from the database")
+            return None
+        manifest = read_manifest(path)
+        if manifest is None or manifest.get("format") != SNAPSHOT_FORMAT:
+            _warn_once(f"Unsupported snapshot at {path}; reading from the database")
+            return None
+        _store = SnapshotStore(path, manifest, key)
+        return _store
@@ -0,0 +1,159 @@
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import zlib
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.db.models import Base
+from app.lib.series_defs import SERIES_TO_LOAD
+from app.services.data_version import bump_data_version
+
+# Synthetic data shaped like the real dataset: the 23 tracked series at their
+# native frequencies from 1960, then padding series of ~17k daily rows each
+# until the observations table reaches the requested size.
+
+DAILY = {"DGS10", "T10Y2Y", "AAA10Y"}
+WEEKLY = {"IC4WSA", "WM2NS"}
+START = date(1960, 1, 1)
+
+def _dates(freq, end):
+    d = START
+    if freq == "W":
+        d += timedelta(days=(5 - d.weekday()) % 7)
+    while d <= end:
+        if freq == "D":
+            if d.weekday() < 5:
+                yield d
+            d += timedelta(days=1)
+        elif freq == "W":
+            yield d
+            d += timedelta(days=7)
+        else:
+            yield d
+            d = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+def _frequency(series_id):
+    if series_id in DAILY or series_id.startswith("SYN"):
+        return "D"
+    if series_id in WEEKLY:
+        return "W"
+    return "M"
+
+def _rows(series_id, end):
+    rng = random.Random(zlib.crc32(series_id.encode()))
+    level = 100.0
+    for d in _dates(_frequency(series_id), end):
+        if series_id == "USREC":
+            value = 1.0 if rng.random() < 0.12 else 0.0
+        else:
+            level += rng.gauss(0.1, 1.0)
+            value = level
+        yield (series_id, d.isoformat(), value)
+
+def seed_database(url, total_rows=None, end=None, chunk=50_000):
+    # Drops and recreates the schema at `url`. Returns the row count written.
+    end = end or date.today()
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    series = [(sid, cat) for sid, cat in SERIES_TO_LOAD.items()]
+    written = 0
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        placeholder = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+        insert_series = f"INSERT INTO series (series_id, name, frequency, units, category, updated_at) VALUES ({', '.join([placeholder] * 6)})"
+        insert_obs = f"INSERT INTO observations (series_id, date, value) VALUES ({placeholder}, {placeholder}, {placeholder})"
+
+        def write(series_id, category):
+            nonlocal written
+            cur.execute(insert_series, (series_id, f"{series_id} (synthetic)", _frequency(series_id), "Index", category, end.isoformat()))
+            batch = []
+            for row in _rows(series_id, end):
+                if total_rows is not None and written + len(batch) >= total_rows:
+                    break
+                batch.append(row)
+                if len(batch) >= chunk:
+                    cur.executemany(insert_obs, batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                cur.executemany(insert_obs, batch)
+                written += len(batch)
+
+        for series_id, category in series:
+            write(series_id, category)
+
+        n = 0
+        while total_rows is not None and written < total_rows:
+            write(f"SYN{n:05d}", "Synthetic")
+            n += 1
+        raw.commit()
+    finally:
+        raw.close()
+
+    try:
+        # Publish a data version stamp the way ingest does
+        with Session(engine) as session:
+            bump_data_version(session)
+    finally:
+        engine.dispose()
+    return written
+
+def count_rows(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM observations")).scalar()
+    finally:
+        engine.dispose()
+
+def sqlite_url(path):
+    return f"sqlite:///{os.path.abspath(path)}"
+
+def time_call(fn, repeat=20, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+    }
+
+def write_results(path, name, results, **meta):
+    payload = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        **meta,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Wrote {path}")
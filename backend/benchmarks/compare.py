@@ -0,0 +1,77 @@
+import argparse
+import json
+
+# Compares two benchmark result files from the same benchmark and flags
+# regressions: latencies (*_ms) that grew or throughput (rps) that dropped by
+# more than --threshold. Exits 1 when any metric regressed, so it can gate CI.
+#
+#   python -m benchmarks.compare bench_results/baseline.json bench_results/http_load.json
+
+# Only the metrics that summarise a run; min/max are too noisy to gate on
+GATED = ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "rps")
+
+def _key(entry):
+    # List items are matched by their identifying field, not their position
+    for field in ("rows", "concurrency"):
+        if field in entry:
+            return f"{field}={entry[field]}"
+    return None
+
+def flatten(value, prefix=""):
+    out = {}
+    if isinstance(value, dict):
+        for k, v in value.items():
+            out.update(flatten(v, f"{prefix}/{k}" if prefix else k))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            key = _key(item) if isinstance(item, dict) else None
+            out.update(flatten(item, f"{prefix}[{key or i}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+def compare(old, new, threshold):
+    if old.get("benchmark") != new.get("benchmark"):
+        raise SystemExit(f"Different benchmarks: {old.get('benchmark')} vs {new.get('benchmark')}")
+    before = flatten(old["results"])
+    after = flatten(new["results"])
+
+    rows = []
+    for key in sorted(set(before) & set(after)):
+        metric = key.rsplit("/", 1)[-1]
+        if metric not in GATED or not before[key]:
+            continue
+        change = after[key] / before[key] - 1
+        # Lower is better for latency, higher for throughput
+        worse = change < -threshold if metric == "rps" else change > threshold
+        better = change > threshold if metric == "rps" else change < -threshold
+        rows.append((key, before[key], after[key], change, "REGRESSED" if worse else ("improved" if better else "")))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change treated as significant")
+    parser.add_argument("--all", action="store_true", help="Also print unchanged metrics")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        old = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+
+    rows = compare(old, new, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    for key, a, b, change, verdict in rows:
+        if verdict or args.all:
+            print(f"{key:<{width}}  {a:10.2f} -> {b:10.2f}  {change * 100:+7.1f}%  {verdict}")
+
+    regressed = [r for r in rows if r[4] == "REGRESSED"]
+    print(f"{len(rows)} metrics compared, {len(regressed)} regressed, "
+          f"{sum(r[4] == 'improved' for r in rows)} improved (threshold {args.threshold:.0%})")
+    if regressed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import count_rows, seed_database, sqlite_url, summarize, write_results
+
+# HTTP load test of the API running under uvicorn in a subprocess.
+#
+#   python -m benchmarks.http_load --concurrency 1 4 16 64 --duration 10
+#
+# The database is filled the way production fills it: the local FRED stub
+# (scripts.fred_stub) serves the 23 series and the real init_db +
+# fetch_and_store ingest them. --rows N seeds N synthetic rows instead. Each
+# endpoint is then driven at every concurrency level by keep-alive client
+# threads for --duration seconds; latency percentiles, throughput and
+# error/status counts go to the JSON results.
+
+ENDPOINTS = {
+    "healthz": "/healthz",
+    "dial_score": "/api/v1/fred/dial_score",
+    "categories": "/api/v1/fred/categories",
+    "series_rows": "/api/v1/fred/series/PAYEMS",
+    "series_columnar": "/api/v1/fred/series/DGS10?format=columnar",
+    "series_monthly": "/api/v1/fred/series/DGS10?freq=monthly",
+    "history": "/api/v1/ml/history",
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _run(args, env):
+    subprocess.run([sys.executable, "-W", "ignore", "-m", *args], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+def ingest_from_stub(url):
+    # Real ingest path against the stub FRED API
+    from scripts.fred_stub import serve
+
+    port = free_port()
+    stub = serve(port=port)
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    try:
+        env = dict(os.environ, DATABASE_URL=url, FRED_API_URL=f"http://127.0.0.1:{port}/fred", FRED_API_KEY="stub")
+        _run(["scripts.init_db"], env)
+        _run(["scripts.fetch_and_store", "--full"], env)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+def start_server(url, port, workers, log_path, extra_env):
+    env = dict(os.environ, DATABASE_URL=url, **extra_env)
+    log = open(log_path, "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with {proc.returncode}; see {log_path}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"API did not come up on port {port}; see {log_path}")
+
+def run_level(port, path, concurrency, duration, headers):
+    latencies = []
+    statuses = Counter()
+    errors = Counter()
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine = []
+        seen = Counter()
+        failed = Counter()
+        start_gate.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                mine.append((time.perf_counter() - started) * 1000)
+                seen[response.status] += 1
+            except (OSError, http.client.HTTPException) as e:
+                failed[type(e).__name__] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            statuses.update(seen)
+            errors.update(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    started = time.perf_counter()
+    start_gate.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies) if latencies else {"n": 0}
+    stats.update(
+        concurrency=concurrency,
+        rps=len(latencies) / elapsed,
+        statuses={str(k): v for k, v in sorted(statuses.items())},
+        errors=dict(errors),
+    )
+    return stats
+
+def _ms(stats, key):
+    return f"{stats.get(key, float('nan')):8.2f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency sweep against the running API")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per endpoint and level")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--rows", type=int, default=0, help="Seed N synthetic rows instead of ingesting from the stub")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--gzip", action="store_true", help="Send Accept-Encoding: gzip")
+    parser.add_argument("--no-response-cache", action="store_true", help="Run the API with RESPONSE_CACHE=off")
+    parser.add_argument("--db-dir", default="bench_data")
+    parser.add_argument("--reuse", action="store_true", help="Reuse a previously prepared database")
+    parser.add_argument("--output", default="bench_results/http_load.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    path = os.path.join(args.db_dir, f"http_load_{args.rows or 'stub'}.db")
+    url = sqlite_url(path)
+    if not (args.reuse and os.path.exists(path)):
+        if os.path.exists(path):
+            os.remove(path)
+        if args.rows:
+            print(f"Seeding {args.rows:,} rows into {path}...")
+            seed_database(url, total_rows=args.rows)
+        else:
+            print(f"Ingesting the stub FRED series into {path}...")
+            ingest_from_stub(url)
+    rows = count_rows(url)
+
+    port = free_port()
+    log_path = os.path.splitext(args.output)[0] + ".server.log"
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    extra_env = {"RESPONSE_CACHE": "off"} if args.no_response_cache else {}
+    print(f"{rows:,} rows; starting API with {args.workers} worker(s) on port {port}...")
+    server = start_server(url, port, args.workers, log_path, extra_env)
+
+    headers = {"Accept-Encoding": "gzip"} if args.gzip else {}
+    results = {}
+    try:
+        for name in args.endpoints:
+            # A few requests first so one-off loads don't land in the first level
+            run_level(port, ENDPOINTS[name], 1, 0.5, headers)
+            results[name] = []
+            for concurrency in args.concurrency:
+                stats = run_level(port, ENDPOINTS[name], concurrency, args.duration, headers)
+                results[name].append(stats)
+                print(f"  {name:<16} c={concurrency:<3} {stats['rps']:9.1f} req/s  p50 {_ms(stats, 'p50_ms')}  "
+                      f"p95 {_ms(stats, 'p95_ms')}  p99 {_ms(stats, 'p99_ms')} ms  {stats['statuses']}"
+                      + (f"  errors {stats['errors']}" if stats["errors"] else ""))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    write_results(args.output, "http_load", results, rows=rows, server_workers=args.workers,
+                  duration_s=args.duration, gzip=args.gzip, response_cache=not args.no_response_cache,
+                  cpus=os.cpu_count())
+
+if __name__ == "__main__":
+    main()
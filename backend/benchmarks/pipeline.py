@@ -0,0 +1,97 @@
+import argparse
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# app.db.session builds its engines at import time; every case here runs on
+# its own session, so the shared engines only need some URL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.services import features, get_fred_data
+from app.services.data_version import get_db_data_version
+from app.services.features import build_feature_matrix, load_feature_table, read_monthly_levels, refresh_feature_table
+from app.services.get_fred_data import get_categories_with_series, get_series_db
+from app.services.ml_service import predict_recession_prob
+from benchmarks.common import count_rows, seed_database, sqlite_url, time_call, write_results
+
+# Micro-benchmarks of the in-process hot paths against observations table size.
+#
+#   python -m benchmarks.pipeline --rows 0 1000000 10000000
+#
+# 0 seeds only the 23 real series (~75k rows). Larger scales pad the table
+# with synthetic daily series, which the feature pipeline has to read past.
+# "cold" cases reset the process-level caches before every call; "warm" ones
+# measure the cached path a busy API worker sees.
+
+def _reset_feature_cache():
+    features._matrix = None
+
+def _reset_outlook_cache():
+    get_fred_data._outlook = {"key": None, "stamps": {}, "scores": {}}
+
+def run_cases(url, repeat):
+    engine = create_engine(url)
+    session = sessionmaker(bind=engine)()
+    results = {}
+
+    def case(label, fn, setup=None, n=repeat):
+        def call():
+            if setup is not None:
+                setup()
+            fn()
+        stats = time_call(call, repeat=n, warmup=1)
+        results[label] = stats
+        print(f"  {label:<34} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms")
+
+    try:
+        version = get_db_data_version(session)
+        slow = max(3, repeat // 4)
+
+        case("get_series_db DGS10", lambda: get_series_db("DGS10", session=session))
+        case("get_series_db UNRATE", lambda: get_series_db("UNRATE", session=session))
+        case("get_series_db DGS10 monthly", lambda: get_series_db("DGS10", session=session, freq="monthly"))
+
+        case("get_categories_with_series cold", lambda: get_categories_with_series(session=session),
+             setup=_reset_outlook_cache, n=slow)
+        case("get_categories_with_series warm", lambda: get_categories_with_series(session=session))
+
+        case("features read_monthly_levels", lambda: read_monthly_levels(session), n=slow)
+        case("features build from observations",
+             lambda: build_feature_matrix(session, version, use_table=False), n=slow)
+        case("features refresh_feature_table", lambda: refresh_feature_table(session, version=version), n=slow)
+        case("features load_feature_table", lambda: load_feature_table(session, version), n=slow)
+
+        case("predict_recession_prob cold", lambda: predict_recession_prob(session),
+             setup=_reset_feature_cache, n=slow)
+        case("predict_recession_prob warm", lambda: predict_recession_prob(session))
+    finally:
+        session.close()
+        engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark series reads, outlook, features and inference")
+    parser.add_argument("--rows", type=int, nargs="+", default=[0, 1_000_000],
+                        help="Observation table sizes (0 = the real series only)")
+    parser.add_argument("--db-dir", default="bench_data")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--reuse", action="store_true", help="Reuse previously seeded databases")
+    parser.add_argument("--output", default="bench_results/pipeline.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    results = []
+    for rows in args.rows:
+        path = os.path.join(args.db_dir, f"observations_{rows or 'real'}.db")
+        url = sqlite_url(path)
+        if not (args.reuse and os.path.exists(path)):
+            print(f"Seeding {rows or 'real'} rows into {path}...")
+            seed_database(url, total_rows=rows or None)
+        written = count_rows(url)
+        print(f"{written:,} rows")
+        results.append({"rows": written, "cases": run_cases(url, args.repeat)})
+
+    write_results(args.output, "pipeline", results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.services.get_fred_data import get_series_db
+from benchmarks.common import seed_database, sqlite_url, time_call, write_results
+
+# /series read latency against observations table size.
+#
+#   python -m benchmarks.series_reads --rows 1000000 10000000
+#
+# With --compare-no-index each scale is measured again after dropping the
+# (series_id, date) index, i.e. the full-scan behaviour of the old schema.
+
+CASES = [
+    ("DGS10 full history", "DGS10", None),
+    ("DGS10 last 365 days", "DGS10", 365),
+    ("UNRATE full history", "UNRATE", None),
+]
+
+def run_cases(url, repeat):
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    results = {}
+    for label, series_id, days in CASES:
+        start = (date.today() - timedelta(days=days)).isoformat() if days else None
+        session = Session()
+        try:
+            stats = time_call(lambda: get_series_db(series_id, start=start, session=session), repeat=repeat)
+            stats["points"] = get_series_db(series_id, start=start, session=session)["count"]
+        finally:
+            session.close()
+        results[label] = stats
+        print(f"  {label:<22} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  ({stats['points']} points)")
+    engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /series reads against table size")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--db-dir", default="bench_data")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--reuse", action="store_true", help="Reuse previously seeded databases")
+    parser.add_argument("--compare-no-index", action="store_true")
+    parser.add_argument("--output", default="bench_results/series_reads.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    results = []
+    for rows in args.rows:
+        path = os.path.join(args.db_dir, f"observations_{rows}.db")
+        url = sqlite_url(path)
+        if not (args.reuse and os.path.exists(path)):
+            print(f"Seeding {rows:,} rows into {path}...")
+            seed_database(url, total_rows=rows)
+
+        print(f"{rows:,} rows, indexed")
+        results.append({"rows": rows, "index": True, "cases": run_cases(url, args.repeat)})
+
+        if args.compare_no_index:
+            engine = create_engine(url)
+            with engine.begin() as conn:
+                conn.execute(text("DROP INDEX IF EXISTS ix_observations_series_date"))
+            engine.dispose()
+            print(f"{rows:,} rows, no index")
+            results.append({"rows": rows, "index": False, "cases": run_cases(url, max(3, args.repeat // 5))})
+            # Leave the database in its indexed state for --reuse
+            engine = create_engine(url)
+            with engine.begin() as conn:
+                conn.execute(text("CREATE UNIQUE INDEX ix_observations_series_date ON observations (series_id, date)"))
+            engine.dispose()
+
+    write_results(args.output, "series_reads", results)
+
+if __name__ == "__main__":
+    main()
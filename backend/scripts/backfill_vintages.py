@@ -0,0 +1,90 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from dotenv import load_dotenv
+
+from app.db.session import SessionLocal
+from app.db.models import Series, ObservationVintage
+from app.lib.series_defs import SERIES_TO_LOAD
+from app.services.fred_client import FredClient
+from app.services.data_version import get_db_data_version
+from scripts.fetch_and_store import publish
+
+# Replaces the revision history of each series with FRED's own (ALFRED)
+# vintages, so point-in-time scoring sees what was actually published at the
+# time rather than the seed init_db derives from today's values. One-off:
+# afterwards fetch_and_store appends new vintages as it ingests.
+#
+#   python -m scripts.backfill_vintages [--series PAYEMS UNRATE]
+
+DEFAULT_WORKERS = 4
+
+# Rows per INSERT batch
+BATCH_ROWS = 20000
+
+def fetch_vintages(client: FredClient, series_id):
+    started = time.perf_counter()
+    rows = [
+        {
+            "series_id": series_id,
+            "date": date.fromisoformat(d),
+            "value": math.nan if v is None else v,
+            "realtime_start": date.fromisoformat(start),
+            "realtime_end": None if end is None else date.fromisoformat(end),
+        }
+        for d, v, start, end in client.get_observation_vintages(series_id)
+    ]
+    return rows, time.perf_counter() - started
+
+def replace_vintages(session, series_id, rows):
+    # Left uncommitted: publish() commits every series together with the data
+    # version that covers them, so readers never see them under the old one
+    session.query(ObservationVintage).filter(ObservationVintage.series_id == series_id).delete(synchronize_session=False)
+    for i in range(0, len(rows), BATCH_ROWS):
+        session.execute(ObservationVintage.__table__.insert(), rows[i:i + BATCH_ROWS])
+
+def main():
+    parser = argparse.ArgumentParser(description="Load FRED's vintage history into observation_vintages")
+    parser.add_argument("--series", nargs="+", choices=sorted(SERIES_TO_LOAD), help="Only these series")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent FRED fetches")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = FredClient(api_key=os.environ.get("FRED_API_KEY"), pool_size=max(args.workers, 1))
+    session = SessionLocal()
+    try:
+        previous_version = get_db_data_version(session)
+        known = {sid for (sid,) in session.query(Series.series_id)}
+        series = [s for s in (args.series or SERIES_TO_LOAD) if s in known]
+        for s in set(args.series or SERIES_TO_LOAD) - known:
+            print(f"Skipping {s}: not ingested yet (run scripts.fetch_and_store first)")
+
+        stored = 0
+        with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+            futures = {s: pool.submit(fetch_vintages, client, s) for s in series}
+            for series_id in series:
+                try:
+                    rows, fetch_time = futures[series_id].result()
+                except Exception as e:
+                    print(f"Failed to fetch {series_id}: {e}")
+                    continue
+                # A failed write aborts the whole backfill; nothing is published
+                replace_vintages(session, series_id, rows)
+                stored += 1
+                revised = len(rows) - len({r["date"] for r in rows})
+                print(f"Stored {series_id}: {len(rows)} vintages, {revised} revisions (fetch {fetch_time:.2f}s)")
+
+        # Point-in-time reads (as-of scores, point-in-time history) are cached
+        # on the data version, so publish one that covers the new vintages.
+        # Observations are unchanged, which leaves monthly_features to restamp.
+        if stored:
+            publish(session, previous_version, date.today())
+    finally:
+        session.close()
+        client.close()
+
+if __name__ == "__main__":
+    main()
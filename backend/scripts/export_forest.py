@@ -0,0 +1,51 @@
+import argparse
+import time
+import joblib
+import numpy as np
+
+from app.services.forest import export_forest, file_digest
+
+MODEL_PATH = "app/ml_models/recession_model.joblib"
+FOREST_PATH = "app/ml_models/recession_model.forest.npz"
+
+# Compiles an already-trained model into the array format the API serves from.
+# train_model does this automatically; use this after copying in a model file.
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trained forest for sklearn/shap-free serving.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=FOREST_PATH)
+    parser.add_argument("--check-rows", type=int, default=200, help="Random rows to verify against sklearn and shap (0 to skip).")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    started = time.perf_counter()
+    forest = export_forest(model, args.output, source_digest=file_digest(args.model))
+    print(f"Exported {forest.n_trees} trees ({len(forest.value)} nodes, {len(forest.leaf_value)} leaves) to {args.output} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    if args.check_rows:
+        import pandas as pd
+        import shap
+
+        # Sample around the split thresholds so rows land in varied leaves
+        rng = np.random.default_rng(0)
+        thresholds = forest.threshold[forest.left != np.arange(len(forest.left))]
+        features = forest.feature[forest.left != np.arange(len(forest.left))]
+        X = np.zeros((args.check_rows, len(forest.feature_names)))
+        for j in range(len(forest.feature_names)):
+            cuts = thresholds[features == j]
+            X[:, j] = rng.choice(cuts, args.check_rows) + rng.normal(0, 1e-3, args.check_rows) if len(cuts) else 0.0
+        X = pd.DataFrame(X, columns=forest.feature_names)
+
+        proba_diff = np.abs(model.predict_proba(X)[:, 1] - forest.predict_proba(X)).max()
+        expected = shap.TreeExplainer(model).shap_values(X)
+        expected = expected[1] if isinstance(expected, list) else expected
+        if expected.ndim == 3:
+            expected = expected[:, :, 1]
+        shap_diff = np.abs(expected - forest.shap_values(X)).max()
+        print(f"Max |diff| over {args.check_rows} rows: proba {proba_diff:.2e}, shap {shap_diff:.2e}")
+        if proba_diff > 1e-9 or shap_diff > 1e-9:
+            raise SystemExit("Compiled forest does not match the model")
+
+if __name__ == "__main__":
+    main()
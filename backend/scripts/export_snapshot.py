@@ -0,0 +1,24 @@
+import argparse
+
+from app.db.session import SessionLocal
+from app.services.snapshot import FILE_NAMES, SNAPSHOT_DIR, export_snapshot
+
+# Writes/refreshes the columnar snapshot that DATA_BACKEND=snapshot reads.
+# fetch_and_store runs this automatically when that backend is selected.
+
+def main():
+    parser = argparse.ArgumentParser(description="Export observations to a per-series Arrow/Parquet dataset.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--format", choices=sorted(FILE_NAMES), default="arrow",
+                        help="arrow (memory-mapped by the API) or parquet (compact, for other tools)")
+    parser.add_argument("--full", action="store_true", help="Rewrite every series, not just changed ones.")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        export_snapshot(session, path=args.dir, file_format=args.format, full=args.full)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
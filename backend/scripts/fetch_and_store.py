@@ -1,42 +1,281 @@
+import argparse
+import math
 import os
-from datetime import date
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from dotenv import load_dotenv
-from fredapi import Fred
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.db.session import SessionLocal
-from app.db.models import Series, Observation
-from app.lib.series_defs import SERIES_TO_LOAD
+from app.db.models import MonthlyFeature, Series, Observation, ObservationVintage
+from app.lib.series_defs import SERIES_TO_LOAD, first_release
+from app.services.fred_client import FredClient
+from app.services.data_version import bump_data_version, compute_data_version, get_db_data_version, table_exists
+from app.services.features import build_feature_matrix, load_feature_table, refresh_feature_table
+from app.services.ml_service import active_model, refresh_dial_score
+from app.services.snapshot import DATA_BACKEND, export_snapshot
 
-load_dotenv()
-fred = Fred(api_key=os.environ["FRED_API_KEY"])
-session = SessionLocal()
+# FRED revises recent prints, so incremental runs re-request this many days
+# before the last stored observation and upsert whatever changed.
+DEFAULT_LOOKBACK_DAYS = 90
 
-def store_series(series_id, category):
-    info = fred.get_series_info(series_id)
-    series = Series(
+DEFAULT_WORKERS = 8
+
+def last_stored_dates(session):
+    rows = session.query(Observation.series_id, func.max(Observation.date)).group_by(Observation.series_id).all()
+    return dict(rows)
+
+def _missing(v):
+    # NaN as written, or NULL where the database stores NaN that way (SQLite)
+    return v is None or math.isnan(v)
+
+def _same(a, b):
+    if _missing(a) or _missing(b):
+        return _missing(a) and _missing(b)
+    return a == b
+
+def append_vintages(session, series_id, new_rows, changed_rows, vintage, frequency=None):
+    # Records this run's new and revised prints as vintages starting at
+    # `vintage`, closing the interval of each value a revision replaces.
+    # A second run on the same day rewrites that day's vintage.
+    if not new_rows and not changed_rows:
+        return
+    first_load = session.query(ObservationVintage.id).filter(ObservationVintage.series_id == series_id).first() is None
+    if first_load:
+        # No history for the series yet (a fresh database or a new series):
+        # as in init_db's seed, each value counts as known from its
+        # approximate first release (never after this run), so past as-of
+        # dates have data before backfill_vintages runs
+        rows = [
+            dict(r, realtime_start=min(first_release(series_id, frequency, r["date"]), vintage), realtime_end=None)
+            for r in new_rows + changed_rows
+        ]
+        session.execute(ObservationVintage.__table__.insert(), rows)
+        return
+    if changed_rows:
+        session.execute(
+            update(ObservationVintage)
+            .where(
+                ObservationVintage.series_id == series_id,
+                ObservationVintage.date.in_([r["date"] for r in changed_rows]),
+                ObservationVintage.realtime_end.is_(None),
+                ObservationVintage.realtime_start < vintage,
+            )
+            .values(realtime_end=vintage)
+            .execution_options(synchronize_session=False)
+        )
+
+    rows = [dict(r, realtime_start=vintage, realtime_end=None) for r in new_rows + changed_rows]
+    dialect = session.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(ObservationVintage)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["series_id", "date", "realtime_start"],
+            set_={"value": stmt.excluded.value, "realtime_end": None}
+        )
+        session.execute(stmt, rows)
+    else:
+        session.query(ObservationVintage).filter(
+            ObservationVintage.series_id == series_id,
+            ObservationVintage.date.in_([r["date"] for r in rows]),
+            ObservationVintage.realtime_start == vintage,
+        ).delete(synchronize_session=False)
+        session.execute(ObservationVintage.__table__.insert(), rows)
+
+def upsert_observations(session, series_id, rows, vintage=None, frequency=None):
+    # rows: [{"series_id", "date", "value"}] sorted by date. Returns (inserted,
+    # updated, earliest date written or None). With a `vintage` date the
+    # writes are also appended to observation_vintages (`frequency`, FRED's
+    # short code, dates a series' first load).
+    if not rows:
+        return 0, 0, None
+
+    existing = dict(
+        session.query(Observation.date, Observation.value)
+        .filter(Observation.series_id == series_id, Observation.date >= rows[0]["date"])
+        .all()
+    )
+    new_rows = [r for r in rows if r["date"] not in existing]
+    changed_rows = [r for r in rows if r["date"] in existing and not _same(existing[r["date"]], r["value"])]
+
+    dialect = session.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(Observation)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["series_id", "date"],
+            set_={"value": stmt.excluded.value}
+        )
+        if new_rows or changed_rows:
+            session.execute(stmt, new_rows + changed_rows)
+    else:
+        for r in changed_rows:
+            session.query(Observation).filter_by(series_id=series_id, date=r["date"]).update({"value": r["value"]})
+        if new_rows:
+            session.execute(Observation.__table__.insert(), new_rows)
+
+    if vintage is not None:
+        append_vintages(session, series_id, new_rows, changed_rows, vintage, frequency)
+
+    touched = min((r["date"] for r in new_rows + changed_rows), default=None)
+    return len(new_rows), len(changed_rows), touched
+
+def fetch_series(client: FredClient, series_id, start=None):
+    # Worker stage: HTTP only, no DB access
+    started = time.perf_counter()
+    info = client.get_series_info(series_id)
+    observations = client.get_observations(series_id, observation_start=start)
+    # FRED's "." missing marker is stored as NaN, as the original loader did
+    rows = [
+        {
+            "series_id": series_id,
+            "date": date.fromisoformat(d),
+            "value": math.nan if v is None else v
+        }
+        for d, v in observations
+    ]
+    return info, rows, time.perf_counter() - started
+
+def write_series(session, series_id, category, info, rows, vintage=None):
+    # Writer stage: runs on a single thread, one commit per series
+    session.merge(Series(
         series_id=series_id,
         name=info.get("title"),
         frequency=info.get("frequency_short"),
         units=info.get("units_short"),
         category=category,
         updated_at=date.today()
-    )
-    session.merge(series)
+    ))
+    inserted, updated, touched = upsert_observations(session, series_id, rows, vintage, info.get("frequency_short"))
+    session.commit()
+    return inserted, updated, touched
 
-    session.query(Observation).filter_by(series_id=series_id).delete()
+def ingest(session, client: FredClient, series_ids=None, full=False, lookback_days=DEFAULT_LOOKBACK_DAYS,
+           workers=DEFAULT_WORKERS):
+    # Fetches and stores `series_ids` (default: all of SERIES_TO_LOAD) without
+    # publishing a data version. Returns (inserted, updated, earliest date
+    # written or None, series that failed).
+    series = {sid: SERIES_TO_LOAD[sid] for sid in (series_ids or SERIES_TO_LOAD)}
+    started = time.perf_counter()
+    total_inserted = total_updated = 0
+    first_touched = None
+    failed = []
 
-    data = fred.get_series(series_id)
-    for d, v in data.items():
-        if v is not None:
-            obs = Observation(series_id=series_id, date=d.date(), value=float(v))
-            session.add(obs)
+    # Everything this run writes is the vintage FRED publishes today
+    vintage = date.today() if table_exists(session, ObservationVintage.__tablename__) else None
+    if vintage is None:
+        print("observation_vintages is missing (run scripts.init_db); revisions will not be recorded")
+    last_dates = {} if full else last_stored_dates(session)
+    starts = {
+        series_id: last_dates[series_id] - timedelta(days=lookback_days)
+        for series_id in series if last_dates.get(series_id) is not None
+    }
 
-    session.commit()
-    print(f"Stored {series_id}: {len(data)} rows")
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {
+            series_id: pool.submit(fetch_series, client, series_id, starts.get(series_id))
+            for series_id in series
+        }
+
+        # Consume in SERIES_TO_LOAD order so commits are deterministic while
+        # later series keep downloading in the background
+        for series_id, category in series.items():
+            try:
+                info, rows, fetch_time = futures[series_id].result()
+                write_started = time.perf_counter()
+                inserted, updated, touched = write_series(session, series_id, category, info, rows, vintage)
+                total_inserted += inserted
+                total_updated += updated
+                if touched is not None and (first_touched is None or touched < first_touched):
+                    first_touched = touched
+
+                start = starts.get(series_id)
+                mode = "full" if start is None else f"since {start}"
+                print(f"Stored {series_id} ({mode}): {len(rows)} fetched, {inserted} inserted, "
+                      f"{updated} updated (fetch {fetch_time:.2f}s, write {time.perf_counter() - write_started:.2f}s)")
+            except Exception as e:
+                session.rollback()
+                failed.append(series_id)
+                print(f"Failed to store {series_id}: {e}")
 
+    print(f"Ingest finished in {time.perf_counter() - started:.2f}s: "
+          f"{total_inserted} inserted, {total_updated} updated")
+    return total_inserted, total_updated, first_touched, failed
 
-for series_id, category in SERIES_TO_LOAD.items():
+def publish(session, previous_version, since):
+    # Publishes writes made since `previous_version`. monthly_features (from
+    # `since`; None rebuilds it), the dial score and the data version API
+    # caches key on are committed together, as in scheduler.run_pass, so
+    # readers see either the published version with its features or the new
+    # one with its own. Also run by backfill_vintages, whose vintage writes
+    # go out in the same commit.
+    version = compute_data_version(session)
+
+    # Recompute monthly_features from the first month this run wrote to
+    if not table_exists(session, MonthlyFeature.__tablename__):
+        print("monthly_features is missing (run scripts.init_db); the API will derive features itself")
+    else:
+        try:
+            # Nothing written still restamps the table (one month) for the new version
+            months = refresh_feature_table(session, since=since, version=version,
+                                           base_version=previous_version, commit=False)
+            print(f"Monthly features: {months} months written" + (f" (since {since})" if since else " (full rebuild)"))
+        except Exception as e:
+            # Like a failed scheduler pass: nothing goes out, readers stay on
+            # the published version
+            session.rollback()
+            print(f"Failed to refresh monthly features, nothing published: {e}")
+            return None
+
+    # Precompute the dial score for the new data so the API never runs SHAP inline
     try:
-        store_series(series_id, category)
+        matrix = load_feature_table(session, version)
+        if matrix is None:
+            matrix = build_feature_matrix(session, version, use_table=False)
+        result = refresh_dial_score(session, f"{version}:{active_model().version}", matrix=matrix, commit=False)
+        if result is not None:
+            print(f"Dial score refreshed: {result['score']:.2f}")
     except Exception as e:
-        print(f"Failed to store {series_id}: {e}")
\ No newline at end of file
+        # Scoring fails before anything is written; the features still go out
+        print(f"Failed to refresh dial score: {e}")
+
+    version = bump_data_version(session)
+    print(f"Data version: {previous_version} -> {version}")
+
+    if DATA_BACKEND == "snapshot":
+        # Readers follow the snapshot's version, so it is synced last too
+        try:
+            export_snapshot(session)
+        except Exception as e:
+            print(f"Failed to export snapshot: {e}")
+    return version
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch FRED series into the database")
+    parser.add_argument("--full", action="store_true", help="Re-fetch the whole history of every series")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS,
+                        help="Days before the last stored observation to re-fetch for revisions")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent FRED fetches")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = FredClient(api_key=os.environ.get("FRED_API_KEY"), pool_size=max(args.workers, 1))
+    session = SessionLocal()
+
+    try:
+        previous_version = get_db_data_version(session)
+        _, _, first_touched, _ = ingest(session, client, full=args.full, lookback_days=args.lookback_days,
+                                        workers=args.workers)
+
+        since = None if args.full else (first_touched or date.today())
+        publish(session, previous_version, since)
+    finally:
+        session.close()
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from app.lib.series_defs import SERIES_TO_LOAD
+
+# Local stand-in for the FRED endpoints ingest and the scheduler use. Serves deterministic
+# synthetic data for SERIES_TO_LOAD (and, given realtime_start, ALFRED-style
+# vintages of it) so fetch_and_store and backfill_vintages run offline:
+#
+#   python -m scripts.fred_stub --port 8081 --latency 0.3
+#   FRED_API_URL=http://127.0.0.1:8081/fred FRED_API_KEY=stub python -m scripts.fetch_and_store
+
+DAILY = {"DGS10", "T10Y2Y", "AAA10Y"}
+WEEKLY = {"IC4WSA", "WM2NS"}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _frequency(series_id):
+    if series_id in DAILY:
+        return "D"
+    if series_id in WEEKLY:
+        return "W"
+    return "M"
+
+def _dates(freq, start, end):
+    d = start
+    while d <= end:
+        if freq == "D":
+            if d.weekday() < 5:
+                yield d
+            d += timedelta(days=1)
+        elif freq == "W":
+            yield d
+            d += timedelta(days=7)
+        else:
+            yield d
+            d = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+def observations(series_id, start_year):
+    with _cache_lock:
+        key = (series_id, start_year)
+        if key not in _cache:
+            rng = random.Random(zlib.crc32(series_id.encode()))
+            freq = _frequency(series_id)
+            start = date(start_year, 1, 1)
+            if freq == "W":
+                start += timedelta(days=(5 - start.weekday()) % 7)
+            obs = []
+            level = 100.0
+            for d in _dates(freq, start, date.today()):
+                if series_id == "USREC":
+                    value = "1" if rng.random() < 0.12 else "0"
+                elif rng.random() < 0.002:
+                    value = "."
+                else:
+                    level += rng.gauss(0.1, 1.0)
+                    value = f"{level:.4f}"
+                obs.append({"date": d.isoformat(), "value": value})
+            _cache[key] = obs
+        return _cache[key]
+
+def _release(freq, d):
+    # When a print for date d comes out: next day, end of week, or mid next month
+    if freq == "D":
+        return d + timedelta(days=1)
+    if freq == "W":
+        return d + timedelta(days=5)
+    return date(d.year + d.month // 12, d.month % 12 + 1, 15)
+
+def vintages(series_id, start_year):
+    # ALFRED-style rows for observations(): monthly values first print with
+    # some noise and are revised to their final value a month later
+    rng = random.Random(zlib.crc32(f"{series_id}:vintages".encode()))
+    freq = _frequency(series_id)
+    today = date.today()
+    out = []
+    for o in observations(series_id, start_year):
+        if o["value"] == ".":
+            continue
+        d = date.fromisoformat(o["date"])
+        first = min(_release(freq, d), today)
+        revised = min(first + timedelta(days=30), today)
+        if freq == "M" and series_id != "USREC" and revised > first:
+            noisy = f"{float(o['value']) + rng.gauss(0, 0.5):.4f}"
+            out.append(dict(o, value=noisy, realtime_start=first.isoformat(), realtime_end=revised.isoformat()))
+            first = revised
+        out.append(dict(o, realtime_start=first.isoformat(), realtime_end="9999-12-31"))
+    return out
+
+# One synthetic release per frequency: every business day, every Thursday,
+# and the 15th of each month
+RELEASES = {"D": 1, "W": 2, "M": 3}
+
+def release_dates(release_id, start=None, days=90):
+    freq = {v: k for k, v in RELEASES.items()}.get(release_id)
+    d = date.fromisoformat(start) if start else date.today()
+    out = []
+    for _ in range(days):
+        if (freq == "D" and d.weekday() < 5) or (freq == "W" and d.weekday() == 3) or (freq == "M" and d.day == 15):
+            out.append({"release_id": release_id, "date": d.isoformat()})
+        d += timedelta(days=1)
+    return out
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    start_year = 1960
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        series_id = params.get("series_id")
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self._send(429, {"error_code": 429, "error_message": "Too Many Requests"})
+        if not params.get("api_key"):
+            return self._send(400, {"error_code": 400, "error_message": "Missing api_key"})
+        if url.path.endswith("/release/dates"):
+            return self._send(200, {"release_dates": release_dates(int(params.get("release_id", 0)),
+                                                                  params.get("realtime_start"))})
+        if series_id not in SERIES_TO_LOAD:
+            return self._send(400, {"error_code": 400, "error_message": "Bad Request. The series does not exist."})
+
+        if url.path.endswith("/series/release"):
+            release_id = RELEASES[_frequency(series_id)]
+            return self._send(200, {"releases": [{"id": release_id, "name": f"Stub release {release_id}"}]})
+
+        if url.path.endswith("/series/observations"):
+            if params.get("realtime_start"):
+                obs = vintages(series_id, self.start_year)
+            else:
+                obs = observations(series_id, self.start_year)
+            start = params.get("observation_start")
+            if start:
+                obs = [o for o in obs if o["date"] >= start]
+            count = len(obs)
+            offset = int(params.get("offset", 0))
+            obs = obs[offset:offset + int(params.get("limit", 100000))]
+            return self._send(200, {"count": count, "observations": obs})
+
+        if url.path.endswith("/series"):
+            freq = _frequency(series_id)
+            return self._send(200, {"seriess": [{
+                "id": series_id,
+                "title": f"{series_id} (stub)",
+                "frequency_short": freq,
+                "units_short": "Index",
+                "last_updated": date.today().isoformat()
+            }]})
+
+        self._send(404, {"error_code": 404, "error_message": "Not Found"})
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=8081, latency=0.0, error_rate=0.0, start_year=1960):
+    Handler.latency = latency
+    Handler.error_rate = error_rate
+    Handler.start_year = start_year
+    server = ThreadingHTTPServer((host, port), Handler)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub FRED API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--start-year", type=int, default=1960)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.error_rate, args.start_year)
+    print(f"Stub FRED API on http://{args.host}:{args.port}/fred")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,107 @@
-from app.db.models import Base
-from app.db.session import engine
+from datetime import date
+from sqlalchemy import and_, delete, inspect, literal, select, text
+from app.db.models import Base, Observation, ObservationVintage, Series
+from app.db.session import SessionLocal, engine
+from app.lib.series_defs import first_release
+from app.services.data_version import get_db_data_version
+from scripts.fetch_and_store import publish
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+
+def _outdated(index, existing):
+    # True when an index of this name exists but with an older definition,
+    # e.g. ix_observations_series_date from before it carried INCLUDE (value)
+    columns = [c.name for c in index.columns]
+    include = list(index.dialect_options["postgresql"]["include"] or []) if engine.dialect.name == "postgresql" else []
+    return (
+        existing["column_names"] != columns
+        or bool(existing["unique"]) != bool(index.unique)
+        or list(existing.get("dialect_options", {}).get("postgresql_include", [])) != include
+    )
+
+# create_all skips tables that already exist, so add any indexes introduced
+# since the table was first created, and rebuild the ones whose definition
+# changed (create checks by name only)
+inspector = inspect(engine)
+for table in Base.metadata.sorted_tables:
+    existing = {ix["name"]: ix for ix in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        try:
+            if index.name in existing and _outdated(index, existing[index.name]):
+                print(f"Rebuilding index {index.name}")
+                index.drop(bind=engine)
+            index.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            print(f"Failed to create index {index.name}: {e}")
+
+# Ingest briefly wrote FRED's missing marker as NULL instead of NaN. Postgres
+# keeps the two apart, so bring those rows back to NaN (SQLite stores NaN as
+# NULL either way).
+if engine.dialect.name == "postgresql":
+    with engine.begin() as conn:
+        for table in ("observations", "observation_vintages"):
+            fixed = conn.execute(text(f"UPDATE {table} SET value = 'NaN' WHERE value IS NULL")).rowcount
+            if fixed:
+                print(f"Stored {fixed} missing values in {table} as NaN")
+
+# Rows per INSERT batch when (re)writing seeded vintages
+SEED_BATCH_ROWS = 20000
+
+def _seed_rows(conn, condition=None):
+    # Observations (or, given a condition, existing vintages) dated by their
+    # approximate first release instead of the day they measure
+    source = ObservationVintage if condition is not None else Observation
+    query = select(
+        source.series_id, source.date, source.value,
+        (source.realtime_end if condition is not None else literal(None)), Series.frequency
+    ).outerjoin(Series, Series.series_id == source.series_id)
+    if condition is not None:
+        query = query.where(condition)
+    today = date.today()
+    rows = []
+    for series_id, obs_date, value, end, frequency in conn.execute(query):
+        start = min(first_release(series_id, frequency, obs_date), today)
+        if end is not None and start >= end:
+            # Revised before its approximate first release; the later vintage covers it
+            continue
+        rows.append({"series_id": series_id, "date": obs_date, "value": value,
+                     "realtime_start": start, "realtime_end": end})
+    return rows
+
+def _insert_vintages(conn, rows):
+    for i in range(0, len(rows), SEED_BATCH_ROWS):
+        conn.execute(ObservationVintage.__table__.insert(), rows[i:i + SEED_BATCH_ROWS])
+
+# Seed the revision history from the current observations the first time the
+# table appears. Their vintages are unknown, so each value counts as known
+# from its approximate first release (the end of its period plus the series'
+# release lag); scripts.backfill_vintages replaces them with FRED's.
+with engine.begin() as conn:
+    if conn.execute(text("SELECT 1 FROM observation_vintages LIMIT 1")).first() is None:
+        rows = _seed_rows(conn)
+        _insert_vintages(conn, rows)
+        if rows:
+            print(f"Seeded {len(rows)} observation vintages from current values")
+
+# Earlier seeds counted each value as known from its own date, so a month's
+# print leaked into as-of scores for that same month. FRED's own vintages
+# never start on the observation date, so those rows are the seeded ones:
+# re-date them and publish a version that covers the change. (A value dated
+# today stays put: its release can't be later than today.)
+seeded = and_(ObservationVintage.realtime_start == ObservationVintage.date, ObservationVintage.date < date.today())
+with engine.begin() as conn:
+    rows = _seed_rows(conn, seeded)
+    if rows or conn.execute(select(ObservationVintage.id).where(seeded).limit(1)).first() is not None:
+        conn.execute(delete(ObservationVintage).where(seeded))
+        _insert_vintages(conn, rows)
+        print(f"Re-dated {len(rows)} seeded observation vintages by release lag")
+        redated = True
+    else:
+        redated = False
+
+if redated:
+    session = SessionLocal()
+    try:
+        publish(session, get_db_data_version(session), date.today())
+    finally:
+        session.close()
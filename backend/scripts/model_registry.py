@@ -0,0 +1,110 @@
+import argparse
+import time
+import joblib
+import numpy as np
+
+from app.db.session import SessionLocal
+from app.services.features import build_feature_matrix
+from app.services.ml_service import LoadedModel
+from app.services.model_registry import (
+    CANDIDATE, CURRENT, MODEL_PATH, REGISTRY_DIR, get_ref, list_versions, promote, read_pointer,
+    register_model, resolve, rollback, set_candidate
+)
+
+# Manage the versions in the model registry. Running API workers follow the
+# pointers within MODEL_POLL_SECONDS, without a restart:
+#
+#   python -m scripts.model_registry list
+#   python -m scripts.model_registry promote <version>
+#   python -m scripts.model_registry rollback
+#   python -m scripts.model_registry shadow <version>     (or --clear)
+#   python -m scripts.model_registry compare [<version>]  live vs candidate over history
+#   python -m scripts.model_registry import-legacy        register recession_model.joblib
+
+def cmd_list(args):
+    current = read_pointer(CURRENT)
+    candidate = read_pointer(CANDIDATE)
+    versions = list_versions()
+    if not versions:
+        print(f"No versions in {REGISTRY_DIR}; serving {MODEL_PATH}")
+        return
+    for meta in versions:
+        flag = "*" if meta["version"] == current else ("s" if meta["version"] == candidate else " ")
+        window = "..".join(meta.get("training_window") or ["?", "?"])
+        print(f"{flag} {meta['version']}  {meta.get('source', '?'):<14} {window}  {meta.get('metrics', {})}")
+
+def cmd_promote(args):
+    promote(args.version)
+    print(f"Serving {args.version}")
+
+def cmd_rollback(args):
+    print(f"Rolled back to {rollback()}")
+
+def cmd_shadow(args):
+    set_candidate(None if args.clear else args.version)
+    print("Shadow scoring stopped" if args.clear else f"Shadow scoring {args.version}")
+
+def cmd_compare(args):
+    # Scores every month with both models: per-row latency and output drift
+    live = LoadedModel(resolve(CURRENT)).prepare()
+    ref = resolve(CANDIDATE) if args.version is None else get_ref(args.version)
+    if ref is None:
+        raise SystemExit("No candidate set; pass a version")
+    candidate = LoadedModel(ref).prepare()
+
+    session = SessionLocal()
+    try:
+        matrix = build_feature_matrix(session)
+    finally:
+        session.close()
+
+    results = {}
+    for name, model in (("live", live), ("candidate", candidate)):
+        X = matrix.select(model.feature_names).fillna(0)
+        started = time.perf_counter()
+        probs = model.predict_proba(X)
+        results[name] = (probs, (time.perf_counter() - started) * 1000, model.version)
+
+    diff = np.abs(results["live"][0] - results["candidate"][0])
+    for name, (probs, ms, version) in results.items():
+        print(f"{name:<10} {version}  {ms:7.1f} ms for {len(probs)} months, latest {probs[-1] * 100:.2f}")
+    print(f"drift: mean |diff| {diff.mean() * 100:.2f} pts, max {diff.max() * 100:.2f} pts "
+          f"({matrix.index[int(diff.argmax())]:%Y-%m}), latest {diff[-1] * 100:.2f} pts")
+
+def cmd_import_legacy(args):
+    model = joblib.load(MODEL_PATH)
+    version = register_model(model, {"source": f"import:{MODEL_PATH}"}, activate=not args.no_activate)
+    print(f"Registered {MODEL_PATH} as {version}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List versions (* serving, s shadow).").set_defaults(fn=cmd_list)
+
+    p = commands.add_parser("promote", help="Serve a version.")
+    p.add_argument("version")
+    p.set_defaults(fn=cmd_promote)
+
+    commands.add_parser("rollback", help="Serve the previously served version.").set_defaults(fn=cmd_rollback)
+
+    p = commands.add_parser("shadow", help="Shadow-score a version next to the live one.")
+    p.add_argument("version", nargs="?")
+    p.add_argument("--clear", action="store_true")
+    p.set_defaults(fn=cmd_shadow)
+
+    p = commands.add_parser("compare", help="Compare a version (default: the candidate) with the live model.")
+    p.add_argument("version", nargs="?")
+    p.set_defaults(fn=cmd_compare)
+
+    p = commands.add_parser("import-legacy", help=f"Register {MODEL_PATH} as a version.")
+    p.add_argument("--no-activate", action="store_true")
+    p.set_defaults(fn=cmd_import_legacy)
+
+    args = parser.parse_args()
+    if args.command == "shadow" and not args.clear and args.version is None:
+        parser.error("shadow needs a version or --clear")
+    args.fn(args)
+
+if __name__ == "__main__":
+    main()
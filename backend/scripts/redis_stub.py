@@ -0,0 +1,141 @@
+import argparse
+import socketserver
+import threading
+import time
+
+# Minimal Redis-compatible server (RESP2/RESP3) covering the commands the response
+# cache uses, so RESPONSE_CACHE=redis can be exercised without a real Redis:
+#
+#   python -m scripts.redis_stub --port 6380
+#   RESPONSE_CACHE=redis REDIS_URL=redis://127.0.0.1:6380/0 uvicorn app.main:app
+#
+# Supports HELLO (RESP2/3), PING, SELECT, CLIENT, GET, SET [EX|PX], DEL,
+# EXISTS, SCAN (MATCH on a trailing *), DBSIZE, FLUSHDB/FLUSHALL; anything else
+# gets an error reply.
+
+_store = {}
+_lock = threading.Lock()
+
+def _get(key):
+    item = _store.get(key)
+    if item is None:
+        return None
+    value, expires = item
+    if expires is not None and expires < time.monotonic():
+        del _store[key]
+        return None
+    return value
+
+def _bulk(value, resp3=False):
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+def _array(items):
+    return b"*" + str(len(items)).encode() + b"\r\n" + b"".join(items)
+
+def _int(n):
+    return b":" + str(n).encode() + b"\r\n"
+
+def _hello(protocol):
+    fields = [b"server", b"redis", b"version", b"7.0.0", b"proto", protocol]
+    items = [_int(v) if isinstance(v, int) else _bulk(v) for v in fields]
+    if protocol == 3:
+        return b"%3\r\n" + b"".join(items)
+    return _array(items)
+
+def execute(args, resp3=False):
+    command = args[0].upper()
+    with _lock:
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"SELECT", b"CLIENT"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            return _bulk(_get(args[1]), resp3)
+        if command == b"SET":
+            expires = None
+            options = [a.upper() for a in args[3:]]
+            if b"EX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            _store[args[1]] = (args[2], expires)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return _int(sum(_store.pop(k, None) is not None for k in args[1:]))
+        if command == b"EXISTS":
+            return _int(sum(_get(k) is not None for k in args[1:]))
+        if command == b"SCAN":
+            options = [a.upper() for a in args]
+            prefix = b""
+            if b"MATCH" in options:
+                prefix = args[options.index(b"MATCH") + 1].rstrip(b"*")
+            keys = [k for k in list(_store) if k.startswith(prefix) and _get(k) is not None]
+            return _array([_bulk(b"0"), _array([_bulk(k) for k in keys])])
+        if command == b"DBSIZE":
+            return _int(len(_store))
+        if command in (b"FLUSHDB", b"FLUSHALL"):
+            _store.clear()
+            return b"+OK\r\n"
+    return b"-ERR unknown command '" + args[0] + b"'\r\n"
+
+class Handler(socketserver.StreamRequestHandler):
+    resp3 = False
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command (e.g. from telnet)
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            if args[0].upper() == b"HELLO":
+                # Protocol negotiation is per connection
+                protocol = int(args[1]) if len(args) > 1 else 2
+                self.resp3 = protocol == 3
+                self.wfile.write(_hello(protocol))
+            else:
+                self.wfile.write(execute(args, self.resp3))
+            self.wfile.flush()
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(host="127.0.0.1", port=6380):
+    return Server((host, port), Handler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Redis stand-in for the response cache")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"Redis stub on redis://{args.host}:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
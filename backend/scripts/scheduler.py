@@ -0,0 +1,247 @@
+import argparse
+import fcntl
+import json
+import os
+import signal
+import threading
+import time
+from datetime import date, timedelta
+from dotenv import load_dotenv
+
+from app.db.models import DialScore, MonthlyFeatureState
+from app.db.session import SessionLocal
+from app.lib.series_defs import SERIES_TO_LOAD
+from app.services.backtest import load_history, update_history
+from app.services.data_version import bump_data_version, compute_data_version, get_db_data_version, table_exists
+from app.services.features import build_feature_matrix, load_feature_table, refresh_feature_table
+from app.services.fred_client import FredClient
+from app.services.ml_service import active_model, refresh_dial_score
+from app.services.snapshot import DATA_BACKEND, export_snapshot
+from scripts.fetch_and_store import DEFAULT_WORKERS, ingest
+
+# Background refresh worker, run as its own process next to the API:
+#
+#   python -m scripts.scheduler           # run until stopped
+#   python -m scripts.scheduler --once    # one pass, e.g. from cron
+#
+# Each pass walks the dependency chain and runs a step only when its input
+# moved:
+#
+#   fetch     series whose FRED release is due and whose last_updated changed
+#   features  monthly_features, when the stored data differs from its version
+#   dial      the dial score for that data version and the current model
+#   publish   the data_version stamp (+ the snapshot with DATA_BACKEND=snapshot)
+#   history   history.json, when the published data or the model changed
+#
+# The version is published only after its features and dial score exist, and
+# API workers read the stamp on every request, so they switch to the new data
+# without a restart or any recompute of their own (run them with
+# INLINE_REFRESH=0). Steps key on what is stored, not on what the last pass
+# did, so a pass that dies halfway is finished by the next one.
+
+STATE_PATH = os.environ.get("SCHEDULER_STATE", "data/scheduler/state.json")
+
+# How often a pass runs. Local steps (a model promotion, an interrupted
+# pass) are picked up within this
+POLL_SECONDS = float(os.environ.get("SCHEDULER_POLL_SECONDS", "60"))
+
+# While a release is due but FRED hasn't posted it yet, its series are
+# re-checked this often
+RELEASE_POLL_SECONDS = float(os.environ.get("SCHEDULER_RELEASE_POLL_SECONDS", "900"))
+
+# A release that hasn't shown up is given up on this many days after its date
+RELEASE_GRACE_DAYS = 1
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {"series": {}, "releases": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+def refresh_calendar(client: FredClient, state, today):
+    # Release of each series and its upcoming dates, re-read once a day
+    if state.get("calendar_checked") == today.isoformat():
+        return
+    series = state["series"]
+    for series_id in SERIES_TO_LOAD:
+        entry = series.setdefault(series_id, {})
+        if "release_id" not in entry:
+            entry["release_id"] = client.get_series_release(series_id)["id"]
+    # Starts a little back so a release posted late is still on the calendar
+    start = today - timedelta(days=RELEASE_GRACE_DAYS)
+    releases = {}
+    for release_id in sorted({entry["release_id"] for entry in series.values()}):
+        releases[str(release_id)] = client.get_release_dates(release_id, start)
+    state["releases"] = releases
+    state["calendar_checked"] = today.isoformat()
+
+def pending_release(state, series_id, today):
+    # The latest scheduled release of the series on or before today (within
+    # the grace window) that hasn't been ingested yet, else None
+    entry = state["series"].get(series_id, {})
+    dates = state["releases"].get(str(entry.get("release_id")), [])
+    oldest = (today - timedelta(days=RELEASE_GRACE_DAYS)).isoformat()
+    due = [d for d in dates if oldest <= d <= today.isoformat()]
+    if not due or entry.get("seen_release", "") >= due[-1]:
+        return None
+    return due[-1]
+
+def due_series(client: FredClient, state, today, now=None):
+    # (series to fetch, releases still awaited). Without a calendar every
+    # series is checked; either way only a changed last_updated is fetched.
+    now = time.time() if now is None else now
+    try:
+        refresh_calendar(client, state, today)
+        pending = {s: pending_release(state, s, today) for s in SERIES_TO_LOAD}
+        pending = {s: d for s, d in pending.items() if d is not None}
+    except Exception as e:
+        print(f"Release calendar unavailable, checking every series: {e}")
+        pending = {s: today.isoformat() for s in SERIES_TO_LOAD}
+
+    changed = {}
+    for series_id, release in pending.items():
+        entry = state["series"].setdefault(series_id, {})
+        if now - entry.get("checked_at", 0) < RELEASE_POLL_SECONDS:
+            continue
+        entry["checked_at"] = now
+        try:
+            last_updated = client.get_series_info(series_id).get("last_updated")
+        except Exception as e:
+            print(f"Could not check {series_id}: {e}")
+            continue
+        if last_updated != entry.get("last_updated"):
+            changed[series_id] = (release, last_updated)
+    waiting = [s for s in pending if s not in changed]
+    return changed, waiting
+
+def step_fetch(session, client, state, changed, workers):
+    if not changed:
+        return
+    print(f"fetch: {', '.join(changed)}")
+    _, _, first_touched, failed = ingest(session, client, series_ids=list(changed), workers=workers)
+    for series_id, (release, last_updated) in changed.items():
+        if series_id in failed:
+            continue
+        entry = state["series"].setdefault(series_id, {})
+        entry["last_updated"] = last_updated
+        entry["seen_release"] = release
+    # Earliest month the unpublished writes touched, kept until they are published
+    if first_touched is not None:
+        since = state.get("since")
+        state["since"] = min(since, first_touched.isoformat()) if since else first_touched.isoformat()
+
+def step_features(session, state, version, published):
+    stamp = session.get(MonthlyFeatureState, 1) if table_exists(session, MonthlyFeatureState.__tablename__) else None
+    if stamp is not None and stamp.version == version:
+        return
+    since = state.get("since")
+    months = refresh_feature_table(session, since=date.fromisoformat(since) if since else None,
+                                   version=version, base_version=published, commit=False)
+    print(f"features: {months} months written for {version}")
+
+def step_dial(session, version):
+    score_version = f"{version}:{active_model().version}"
+    if session.get(DialScore, score_version) is not None:
+        return
+    matrix = load_feature_table(session, version)
+    if matrix is None:
+        matrix = build_feature_matrix(session, version, use_table=False)
+    result = refresh_dial_score(session, score_version, matrix=matrix, commit=False)
+    if result is not None:
+        print(f"dial: {result['score']:.2f} for {score_version}")
+
+def step_publish(session, state, version, published):
+    if version == published:
+        # Only the dial can have changed (a model promotion)
+        session.commit()
+        return
+    version = bump_data_version(session)
+    state.pop("since", None)
+    print(f"publish: data version {published} -> {version}")
+    if DATA_BACKEND == "snapshot":
+        try:
+            export_snapshot(session)
+        except Exception as e:
+            print(f"Failed to export snapshot: {e}")
+
+def step_history(session, version):
+    # Keeps the stored history's mode (--shap, --point-in-time) when appending
+    _, meta = load_history()
+    meta = meta or {}
+    if meta.get("data_version") == version and meta.get("model") == active_model().digest:
+        return
+    update_history(session, explain=meta.get("explain", False), top=meta.get("top") or 3,
+                   point_in_time=meta.get("point_in_time", False))
+
+def run_pass(client, state, today=None, workers=DEFAULT_WORKERS, history=True):
+    # One walk down the chain. Returns the release-awaiting series.
+    today = today or date.today()
+    session = SessionLocal()
+    try:
+        changed, waiting = due_series(client, state, today)
+        step_fetch(session, client, state, changed, workers)
+        save_state(state)
+
+        published = get_db_data_version(session)
+        version = compute_data_version(session)
+        # Features, dial score and the version stamp are committed together,
+        # so until publish readers keep the published features and never
+        # rebuild from the fetched rows; a failed pass publishes none of them
+        step_features(session, state, version, published)
+        step_dial(session, version)
+        step_publish(session, state, version, published)
+        save_state(state)
+
+        if history:
+            step_history(session, version)
+        return waiting
+    finally:
+        session.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh data, features, dial score and history on FRED's release calendar")
+    parser.add_argument("--once", action="store_true", help="Run one pass and exit")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent FRED fetches")
+    parser.add_argument("--no-history", action="store_true", help="Skip the history.json step")
+    args = parser.parse_args()
+
+    load_dotenv()
+    os.makedirs(os.path.dirname(STATE_PATH) or ".", exist_ok=True)
+    lock = open(f"{STATE_PATH}.lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise SystemExit(f"Another scheduler holds {STATE_PATH}.lock")
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    client = FredClient(api_key=os.environ.get("FRED_API_KEY"), pool_size=max(args.workers, 1))
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            state = load_state()
+            waiting = []
+            try:
+                waiting = run_pass(client, state, workers=args.workers, history=not args.no_history)
+            except Exception as e:
+                print(f"Scheduler pass failed: {e}")
+            if args.once:
+                break
+            if waiting:
+                print(f"Release due, not posted yet: {', '.join(waiting)}")
+            stop.wait(max(POLL_SECONDS - (time.perf_counter() - started), 1.0))
+    finally:
+        client.close()
+        lock.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,45 @@
+import argparse
+import json
 import os
-import pandas as pd
+import shutil
+import tempfile
+import time
+from datetime import datetime
 import joblib
+from joblib import Parallel, delayed
 from sqlalchemy.orm import Session
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
-from sklearn.impute import SimpleImputer
+from sklearn.model_selection import ParameterGrid, ParameterSampler, TimeSeriesSplit, train_test_split
+from sklearn.metrics import accuracy_score, brier_score_loss, classification_report, log_loss, roc_auc_score
 import numpy as np
 
 from app.db.session import SessionLocal
-from app.db.models import Observation
-from app.lib.series_defs import SERIES_TO_LOAD
+from app.services.features import LEVEL_SERIES, build_feature_matrix
+from app.services.forest import export_forest, file_digest
+from app.services.model_registry import (
+    CURRENT, FOREST_PATH, MODEL_PATH, REGISTRY_DIR, read_pointer, register_model, resolve, set_candidate
+)
 
-MODEL_PATH = "app/ml_models/recession_model.joblib"
+REPORT_DIR = "data/training"
 
-LEVEL_SERIES = [
-    "PAYEMS", "AHETPI", "PCE", "DSPIC96", "CPIAUCSL", "CPILFESL", 
-    "M2REAL", "WM2NS", "INDPRO", "IPMAN", "HOUST", "PERMIT",
-    "WPSFD49207"
-]
+# Months between the features and the recession flag they predict
+HORIZON = 6
+
+# Search space for --search. Every fold refits one candidate on one core; the
+# pool spreads (candidate, fold) pairs over all cores.
+PARAM_GRID = {
+    "n_estimators": [100, 200, 400],
+    "max_depth": [None, 6, 12],
+    "min_samples_leaf": [1, 5, 10],
+    "max_features": ["sqrt", 0.5, None],
+}
 
 def load_data(session: Session):
-    query = session.query(Observation).statement
-    df = pd.read_sql(query, session.bind)
-    
-    df_pivot = df.pivot(index="date", columns="series_id", values="value")
-    
-    df_pivot.index = pd.to_datetime(df_pivot.index)
-    df_pivot.sort_index(inplace=True)
+    matrix = build_feature_matrix(session)
+    if matrix is None:
+        raise ValueError("No observations found. Run fetch_and_store first.")
     
-    return df_pivot
+    return matrix.frame()
 
 def preprocess_features(df):
     df_proc = df.copy()
@@ -40,55 +50,252 @@ def preprocess_features(df):
             
     return df_proc
 
-def train():
+def load_training_set(session: Session):
+    df_monthly = load_data(session)
+
+    target_col = "USREC"
+    if target_col not in df_monthly.columns:
+        raise ValueError(f"{target_col} not found in data.")
+
+    df_monthly["target"] = df_monthly[target_col].shift(-HORIZON)
+    df_model = df_monthly.dropna(subset=["target"])
+
+    # Drop the original USREC (current state) to avoid "persistence" bias
+    if target_col in df_model.columns:
+        df_model = df_model.drop(columns=[target_col])
+
+    X = df_model.drop(columns=["target"])
+    y = df_model["target"]
+
+    valid_idx = X.dropna().index
+    return X.loc[valid_idx], y.loc[valid_idx]
+
+def save_model(clf):
+    # Written beside the live file and renamed over it, so a server loading
+    # the model never sees a partial pickle
+    tmp = f"{MODEL_PATH}.tmp"
+    joblib.dump(clf, tmp)
+    os.replace(tmp, MODEL_PATH)
+    print(f"Model saved to {MODEL_PATH}")
+
+    export_forest(clf, FOREST_PATH, source_digest=file_digest(MODEL_PATH))
+    print(f"Compiled forest saved to {FOREST_PATH}")
+
+    current = read_pointer(CURRENT)
+    if current is not None:
+        print(f"Note: the registry serves {current} instead; register this fit with --register "
+              f"or scripts.model_registry import-legacy and promote it")
+
+def register_version(clf, X, metrics, source):
+    # New registry version (model, compiled forest, metadata). Not served
+    # until promoted with scripts.model_registry.
+    version = register_model(clf, {
+        "source": source,
+        "training_window": [X.index.min().strftime("%Y-%m-%d"), X.index.max().strftime("%Y-%m-%d")],
+        "rows": len(X),
+        "horizon_months": HORIZON,
+        "metrics": metrics,
+    }, activate=False)
+    print(f"Model registered as {version} in {REGISTRY_DIR}; "
+          f"serve it with: python -m scripts.model_registry promote {version}")
+    return version
+
+def train(register=False):
     session = SessionLocal()
     try:
         print("Loading data...")
-        df = load_data(session)
-        
-        target_col = "USREC"
-        if target_col not in df.columns:
-            raise ValueError(f"{target_col} not found in data.")
-
-        df_monthly = df.resample('ME').last()
-        df_monthly = df_monthly.ffill()
-        
-        for col in df_monthly.columns:
-            if col in LEVEL_SERIES:
-                df_monthly[f"{col}_YoY"] = df_monthly[col].pct_change(12)
-                df_monthly.drop(columns=[col], inplace=True)
-        
-        df_monthly["target"] = df_monthly[target_col].shift(-6)
-        df_model = df_monthly.dropna(subset=["target"])
-        
-        # Drop the original USREC (current state) to avoid "persistence" bias
-        if target_col in df_model.columns:
-            df_model = df_model.drop(columns=[target_col])
-            
-        X = df_model.drop(columns=["target"])
-        y = df_model["target"]
-        
-        valid_idx = X.dropna().index
-        X = X.loc[valid_idx]
-        y = y.loc[valid_idx]
-        
+        X, y = load_training_set(session)
+
         print(f"Training on {len(X)} observations from {X.index.min()} to {X.index.max()}")
         print(f"Features: {X.columns.tolist()}")
-        
+
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-        
+
         clf = RandomForestClassifier(n_estimators=100, random_state=42, min_samples_leaf=5)
         clf.fit(X_train, y_train)
-        
+
         y_pred = clf.predict(X_test)
-        print("Accuracy:", accuracy_score(y_test, y_pred))
+        accuracy = accuracy_score(y_test, y_pred)
+        print("Accuracy:", accuracy)
         print(classification_report(y_test, y_pred))
-        
-        joblib.dump(clf, MODEL_PATH)
-        print(f"Model saved to {MODEL_PATH}")
-        
+
+        if register:
+            register_version(clf, X, {"holdout_accuracy": float(accuracy), "holdout_rows": len(X_test)}, "train")
+        else:
+            save_model(clf)
+
+    finally:
+        session.close()
+
+def _positive_proba(clf, X):
+    # A fold whose training window never saw a recession has a single class
+    if len(clf.classes_) == 1:
+        return np.full(len(X), float(clf.classes_[0]))
+    return clf.predict_proba(X)[:, list(clf.classes_).index(1.0)]
+
+def _score_fold(params, X, y, train_idx, test_idx):
+    # Runs in a pool worker; X and y are read-only memmaps shared by all workers
+    started = time.perf_counter()
+    clf = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    clf.fit(X[train_idx], y[train_idx])
+    proba = _positive_proba(clf, X[test_idx])
+    y_test = y[test_idx]
+
+    both = len(np.unique(y_test)) == 2
+    return {
+        "train_end": int(train_idx[-1]),
+        "test_rows": len(test_idx),
+        "positives": int(y_test.sum()),
+        "brier": float(brier_score_loss(y_test, proba, pos_label=1.0)),
+        "log_loss": float(log_loss(y_test, np.clip(proba, 1e-6, 1 - 1e-6), labels=[0.0, 1.0])),
+        "auc": float(roc_auc_score(y_test, proba)) if both else None,
+        "accuracy": float(accuracy_score(y_test, proba >= 0.5)),
+        "fit_s": round(time.perf_counter() - started, 3),
+    }
+
+def _summarise(params, folds):
+    def mean(key):
+        vals = [f[key] for f in folds if f[key] is not None]
+        return float(np.mean(vals)) if vals else None
+
+    return {
+        "params": params,
+        "brier": mean("brier"),
+        "log_loss": mean("log_loss"),
+        "auc": mean("auc"),
+        "accuracy": mean("accuracy"),
+        "fit_s": round(sum(f["fit_s"] for f in folds), 3),
+        "folds": folds,
+    }
+
+def _candidates(search, n_iter, seed):
+    if search == "grid":
+        return list(ParameterGrid(PARAM_GRID))
+    return list(ParameterSampler(PARAM_GRID, n_iter=n_iter, random_state=seed))
+
+def _incumbent_params():
+    ref = resolve(CURRENT)
+    if ref is None:
+        return None
+    current = joblib.load(ref.model_path).get_params()
+    return {k: current[k] for k in PARAM_GRID}
+
+def walk_forward(X, y, candidates, folds=5, n_jobs=-1):
+    # Expanding-window validation: each fold trains on every month before its
+    # test block, leaving a HORIZON-month gap so no training label peeks into
+    # the test period. (candidate, fold) fits run in a loky process pool over
+    # memmapped copies of X and y instead of each worker receiving its own.
+    splits = list(TimeSeriesSplit(n_splits=folds, gap=HORIZON).split(X))
+    workdir = tempfile.mkdtemp(prefix="cc-train-")
+    try:
+        joblib.dump(np.ascontiguousarray(X, dtype=np.float64), os.path.join(workdir, "X.npy"))
+        joblib.dump(np.ascontiguousarray(y, dtype=np.float64), os.path.join(workdir, "y.npy"))
+        X_shared = joblib.load(os.path.join(workdir, "X.npy"), mmap_mode="r")
+        y_shared = joblib.load(os.path.join(workdir, "y.npy"), mmap_mode="r")
+
+        scored = Parallel(n_jobs=n_jobs, backend="loky", verbose=0)(
+            delayed(_score_fold)(params, X_shared, y_shared, train_idx, test_idx)
+            for params in candidates
+            for train_idx, test_idx in splits
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return [
+        _summarise(params, scored[i * len(splits):(i + 1) * len(splits)])
+        for i, params in enumerate(candidates)
+    ]
+
+def search(mode="random", n_iter=20, folds=5, n_jobs=-1, seed=42, register=True, shadow=False, report_dir=REPORT_DIR):
+    session = SessionLocal()
+    try:
+        print("Loading data...")
+        X, y = load_training_set(session)
     finally:
         session.close()
 
+    candidates = _candidates(mode, n_iter, seed)
+    incumbent = _incumbent_params()
+    if incumbent is not None and incumbent not in candidates:
+        candidates.append(incumbent)
+
+    print(f"Walk-forward search: {len(candidates)} candidates x {folds} folds on {len(X)} months "
+          f"({X.index.min():%Y-%m} to {X.index.max():%Y-%m}), n_jobs={n_jobs}")
+    started = time.perf_counter()
+    results = walk_forward(X, y, candidates, folds=folds, n_jobs=n_jobs)
+    elapsed = time.perf_counter() - started
+
+    # Ranked by mean Brier score: it is defined for folds without a recession
+    # and rewards calibrated probabilities, which is what the dial shows
+    results.sort(key=lambda r: r["brier"])
+    best = results[0]
+    current = next((r for r in results if r["params"] == incumbent), None)
+
+    print(f"{'brier':>8} {'logloss':>8} {'auc':>6} {'acc':>6}  params")
+    for r in results:
+        auc = f"{r['auc']:.3f}" if r["auc"] is not None else "   -  "
+        marker = "  (current)" if r is current else ""
+        print(f"{r['brier']:8.4f} {r['log_loss']:8.4f} {auc:>6} {r['accuracy']:6.3f}  {r['params']}{marker}")
+    print(f"Search finished in {elapsed:.1f}s")
+
+    registered = None
+    if register and (current is None or best["brier"] < current["brier"]):
+        print(f"Registering {best['params']} (fit on all {len(X)} months)")
+        clf = RandomForestClassifier(random_state=42, n_jobs=n_jobs, **best["params"])
+        clf.fit(X, y)
+        # The API and compiled forest score single-threaded
+        clf.set_params(n_jobs=None)
+        metrics = {k: best[k] for k in ("brier", "log_loss", "auc", "accuracy")}
+        metrics["walk_forward_folds"] = folds
+        registered = register_version(clf, X, metrics, f"search:{mode}")
+        if shadow:
+            # Scored next to the live model until promoted with scripts.model_registry
+            set_candidate(registered)
+            print(f"Shadow scoring {registered}")
+    elif register:
+        print("Current model is still the best; not registering")
+
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, f"search-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(report_path, "w") as f:
+        json.dump({
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "mode": mode,
+            "folds": folds,
+            "gap_months": HORIZON,
+            "rows": len(X),
+            "period": [X.index.min().strftime("%Y-%m-%d"), X.index.max().strftime("%Y-%m-%d")],
+            "features": X.columns.tolist(),
+            "elapsed_s": round(elapsed, 1),
+            "best": best["params"],
+            "incumbent": incumbent,
+            "registered": registered,
+            "results": results,
+        }, f, indent=1)
+    print(f"Report written to {report_path}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the recession model.")
+    parser.add_argument("--search", choices=["grid", "random"],
+                        help="Walk-forward hyperparameter search instead of a single fit.")
+    parser.add_argument("--n-iter", type=int, default=20, help="Candidates sampled by --search random.")
+    parser.add_argument("--folds", type=int, default=5, help="Walk-forward folds.")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --search random.")
+    parser.add_argument("--register", action="store_true",
+                        help="Add the fit to the model registry instead of overwriting recession_model.joblib.")
+    parser.add_argument("--no-promote", action="store_true", help="With --search, only write the report.")
+    parser.add_argument("--shadow", action="store_true",
+                        help="Also shadow-score the registered search winner next to the live model.")
+    parser.add_argument("--report-dir", default=REPORT_DIR, help="Where search reports are written.")
+    args = parser.parse_args()
+
+    if args.search:
+        search(mode=args.search, n_iter=args.n_iter, folds=args.folds, n_jobs=args.n_jobs,
+               seed=args.seed, register=not args.no_promote, shadow=args.shadow, report_dir=args.report_dir)
+    else:
+        train(register=args.register)
+
 if __name__ == "__main__":
-    train()
+    main()